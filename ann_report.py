@@ -0,0 +1,137 @@
+import argparse
+import json
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import llm_rag_setup as rag
+from benchmark import load_app_examples, load_example_questions
+from dense_index import DenseIndex, DenseIndexParams
+
+NPROBES = [1, 2, 4, 8, 16, 32]
+
+
+def variants(pca_dim: int) -> List[Tuple[str, Dict, Optional[str], List]]:
+    """(name, build params, search-time knob swept, knob values)"""
+    pca = f"pca{pca_dim}"
+    return [
+        ("hnsw", {"index_type": "hnsw"}, "ef_search", [16, 32, 64, 128, 256]),
+        ("ivf_flat", {"index_type": "ivf_flat"}, "nprobe", NPROBES),
+        ("ivf_pq", {"index_type": "ivf_pq"}, "nprobe", NPROBES),
+        ("sq8", {"quantization": "sq8"}, None, [None]),
+        ("binary", {"quantization": "binary"}, "rescore_factor", [2, 5, 10, 20]),
+        (pca, {"pca_dim": pca_dim}, None, [None]),
+        (f"{pca}+sq8", {"pca_dim": pca_dim, "quantization": "sq8"}, None, [None]),
+        (f"{pca}+binary", {"pca_dim": pca_dim, "quantization": "binary"}, "rescore_factor", [5, 10, 20]),
+        ("hnsw+sq8", {"index_type": "hnsw", "quantization": "sq8"}, "ef_search", [64, 128]),
+    ]
+
+
+def load_queries() -> List[str]:
+    queries = [q for qs in load_example_questions().values() for q in qs]
+    queries += load_app_examples()
+    try:
+        with open("gold_set.json", "r", encoding="utf-8") as f:
+            queries += [item["question"] for item in json.load(f)["items"]]
+    except FileNotFoundError:
+        pass
+    return queries
+
+
+def measure(dense: DenseIndex, queries: np.ndarray, truth: List[List[str]], k: int) -> Dict:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = dense.search(query, k)
+        latencies.append(time.perf_counter() - started)
+        found = {chunk_id for chunk_id, _ in hits}
+        recalls.append(len(found & set(expected)) / len(expected) if expected else 1.0)
+
+    latency_ms = np.array(latencies) * 1000
+    return {
+        f"recall@{k}": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latency_ms, 50)),
+        "p95_ms": float(np.percentile(latency_ms, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recall, latency and memory of ANN / quantized indexes against the flat index"
+    )
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--pca-dim", type=int, default=256)
+    parser.add_argument("--variants", default=None, help="Comma separated subset, e.g. hnsw,sq8,binary")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    rag.configure_logging()
+
+    documents = rag.load_documents()
+    embedding_model = rag.create_embedding_model()
+    vectors = embedding_model.embed_documents_array([doc.page_content for doc in documents])
+    chunk_ids = [doc.metadata["chunk_id"] for doc in documents]
+    print(f"📊 {embedding_model.report()}")
+
+    query_texts = load_queries()
+    queries = np.array([embedding_model.embed_query(q) for q in query_texts], dtype=np.float32)
+
+    flat = DenseIndex.build(vectors, chunk_ids, DenseIndexParams(index_type="flat"))
+    truth = [[chunk_id for chunk_id, _ in flat.search(q, args.k)] for q in queries]
+
+    def row(name: str, knob: str, dense: DenseIndex, build_time: float) -> Dict:
+        return {
+            "variant": name,
+            "knob": knob,
+            "build_s": build_time,
+            "bytes_per_vector": dense.resident_bytes() / len(vectors),
+            "size_mb": dense.resident_bytes() / (1024 * 1024),
+            **measure(dense, queries, truth, args.k),
+        }
+
+    rows = [row("flat", "-", flat, 0.0)]
+    selected = set(args.variants.split(",")) if args.variants else None
+
+    for name, overrides, knob, values in variants(args.pca_dim):
+        if selected is not None and name not in selected:
+            continue
+        params = replace(
+            rag.DENSE_INDEX_PARAMS, **{"index_type": "flat", "quantization": "none", "pca_dim": 0, **overrides}
+        )
+        started = time.perf_counter()
+        try:
+            dense = DenseIndex.build(vectors, chunk_ids, params)
+        except (RuntimeError, ValueError) as e:
+            print(f"⚠️  Skipping {name}: {e}")
+            continue
+        build_time = time.perf_counter() - started
+
+        for value in values:
+            if knob is not None:
+                dense.set_search_params(**{knob: value})
+            rows.append(row(name, f"{knob}={value}" if knob else "-", dense, build_time))
+
+    print(f"\n📊 {len(vectors)} vektör, {len(queries)} sorgu, flat indekse göre recall@{args.k}\n")
+    header = (
+        f"{'variant':<16} {'knob':<18} {'recall':>7} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'build s':>8} {'B/vec':>7} {'MB':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['variant']:<16} {r['knob']:<18} {r[f'recall@{args.k}']:>7.3f} "
+            f"{r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['build_s']:>8.2f} "
+            f"{r['bytes_per_vector']:>7.0f} {r['size_mb']:>7.2f}"
+        )
+    print("\nB/vec: RAM'de tutulan kısım; binary varyantlarda yeniden skorlama vektörleri diskten mmap ile okunur.")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "results": rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Sonuçlar {args.output} dosyasına kaydedildi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import atexit
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from file_lock import file_lock
+from turkish_analyzer import turkish_lower
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def normalize_question(question: str) -> str:
+    return " ".join(_WORD_RE.findall(turkish_lower(question)))
+
+
+def _numbers(text: str) -> List[str]:
+    return sorted(_NUMBER_RE.findall(text))
+
+
+class AnswerCache:
+    """
+    Answers to past questions, looked up by exact normalized text first and
+    then by cosine similarity of the query embedding.
+
+    Entries expire after ttl seconds and the least recently used ones are
+    evicted beyond max_entries. The cache is cleared whenever the index
+    fingerprint (hash of the index manifest) changes, so answers never
+    outlive the chunks they were generated from.
+
+    put() only marks the cache dirty; a timer writes it to disk at most
+    every flush_interval seconds, and once more at interpreter exit.
+    """
+
+    def __init__(
+        self,
+        path: str = "answer_cache",
+        max_entries: int = 512,
+        ttl: float = 7 * 24 * 3600,
+        similarity_threshold: float = 0.95,
+        index_fingerprint: str = "",
+        flush_interval: float = 5.0,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.index_fingerprint = index_fingerprint
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._index: Optional[faiss.Index] = None
+        self._labels: Dict[int, str] = {}
+        self._next_label = 0
+        self._dirty = False
+        self._flush_timer: Optional[threading.Timer] = None
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self._load()
+        atexit.register(self.flush)
+
+    def _entries_path(self) -> str:
+        return os.path.join(self.path, "entries.json")
+
+    def _embeddings_path(self) -> str:
+        return os.path.join(self.path, "embeddings.npy")
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.path, ".lock")
+
+    def _read(self) -> Optional[Tuple[Dict, np.ndarray]]:
+        """The saved payload and embeddings, None when missing or unreadable. Caller holds the file lock."""
+        if not os.path.exists(self._entries_path()):
+            return None
+        try:
+            with open(self._entries_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            embeddings = np.load(self._embeddings_path(), allow_pickle=False)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️  Answer cache unreadable (%s), ignoring it", e)
+            return None
+        if data.get("version") != CACHE_FORMAT_VERSION:
+            return None
+        return data, embeddings
+
+    def _load(self):
+        with file_lock(self._lock_path()):
+            saved = self._read()
+        if saved is None:
+            return
+
+        data, embeddings = saved
+        if data.get("index_fingerprint") != self.index_fingerprint:
+            logger.info("🔄 Index changed since the answer cache was written, clearing it")
+            self.save(merge=False)
+            return
+
+        for entry, embedding in zip(data["entries"], embeddings):
+            self._insert(entry, embedding)
+        self._expire()
+
+    def _merge(self, data: Dict, embeddings: np.ndarray):
+        """Add entries another process saved; they rank as least recently used. Caller holds self._lock."""
+        if data.get("index_fingerprint") != self.index_fingerprint:
+            return
+        for entry, embedding in zip(data["entries"], embeddings):
+            current = self._entries.get(entry["key"])
+            if current is not None and current["created_at"] >= entry["created_at"]:
+                continue
+            if current is not None:
+                self._remove(entry["key"])
+            self._insert(entry, embedding)
+            self._entries.move_to_end(entry["key"], last=False)
+        self._expire()
+
+    def save(self, merge: bool = True):
+        """
+        Write the cache. Worker processes share the directory, so with merge
+        the entries other workers saved meanwhile are read back and kept
+        (and served by this process from now on) instead of overwritten.
+        """
+        with file_lock(self._lock_path()):
+            saved = self._read() if merge else None
+            with self._lock:
+                if saved is not None:
+                    self._merge(*saved)
+                self._dirty = False
+                entries = list(self._entries.values())
+                dim = self._index.d if self._index is not None else 0
+                embeddings = (
+                    np.stack([entry["_embedding"] for entry in entries])
+                    if entries
+                    else np.zeros((0, dim), dtype=np.float32)
+                )
+                payload = {
+                    "version": CACHE_FORMAT_VERSION,
+                    "index_fingerprint": self.index_fingerprint,
+                    "entries": [
+                        {k: v for k, v in entry.items() if not k.startswith("_")}
+                        for entry in entries
+                    ],
+                }
+
+            tmp_entries = f"{self._entries_path()}.{os.getpid()}.tmp"
+            with open(tmp_entries, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+            tmp_embeddings = f"{self._embeddings_path()}.{os.getpid()}.tmp.npy"
+            np.save(tmp_embeddings, embeddings)
+            os.replace(tmp_embeddings, self._embeddings_path())
+            os.replace(tmp_entries, self._entries_path())
+
+    def _insert(self, entry: Dict, embedding: np.ndarray):
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(embedding)
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+
+        label = self._next_label
+        self._next_label += 1
+        self._index.add_with_ids(embedding, np.array([label], dtype=np.int64))
+        self._labels[label] = entry["key"]
+
+        entry["_label"] = label
+        entry["_embedding"] = embedding[0]
+        self._entries[entry["key"]] = entry
+        self._entries.move_to_end(entry["key"])
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._index.remove_ids(np.array([entry["_label"]], dtype=np.int64))
+        del self._labels[entry["_label"]]
+
+    def _expire(self):
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if now - e["created_at"] > self.ttl]:
+            self._remove(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _hit(self, key: str) -> Dict:
+        self._entries.move_to_end(key)
+        entry = self._entries[key]
+        return {
+            "query": entry["question"],
+            "result": entry["result"],
+            "source_documents": [
+                Document(page_content=d["page_content"], metadata=d["metadata"])
+                for d in entry["source_documents"]
+            ],
+        }
+
+    def get_exact(self, question: str, key: Optional[str] = None) -> Optional[Dict]:
+        """key is normalize_question(question), when the caller already has it."""
+        key = key if key is not None else normalize_question(question)
+        with self._lock:
+            self._expire()
+            if key in self._entries:
+                self.exact_hits += 1
+                return self._hit(key)
+        return None
+
+    def get_similar(self, question: str, embedding: List[float], key: Optional[str] = None) -> Optional[Dict]:
+        key = key if key is not None else normalize_question(question)
+        with self._lock:
+            self._expire()
+            if self._index is None or self._index.ntotal == 0:
+                self.misses += 1
+                return None
+
+            query = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+            faiss.normalize_L2(query)
+            scores, labels = self._index.search(query, 1)
+            label, score = int(labels[0][0]), float(scores[0][0])
+
+            match = self._labels.get(label)
+            # "Madde 60" and "Madde 61" embed almost identically, so a semantic
+            # hit also has to mention exactly the same numbers.
+            if match is None or score < self.similarity_threshold or _numbers(match) != _numbers(key):
+                self.misses += 1
+                return None
+
+            self.semantic_hits += 1
+            return self._hit(match)
+
+    def put(self, question: str, embedding: List[float], result: Dict):
+        key = normalize_question(question)
+        entry = {
+            "key": key,
+            "question": question,
+            "result": result["result"],
+            "source_documents": [
+                {"page_content": doc.page_content, "metadata": doc.metadata}
+                for doc in result["source_documents"]
+            ],
+            "created_at": time.time(),
+        }
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(entry, np.asarray(embedding))
+            self._expire()
+            self._dirty = True
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self):
+        """Write the cache if put() changed it since the last save."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty:
+                return
+        self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._labels.clear()
+            self._index = None
+        self.save(merge=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,219 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Union
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field
+
+import llm_rag_setup as rag
+import rag_service
+from metadata_filter import FILTER_FIELDS
+from metrics import CONTENT_TYPE, REGISTRY, remove_stale_dumps, start_metrics_dumper
+from request_limiter import QueueFullError, QueueTimeoutError
+
+API_HOST = os.getenv("API_HOST", "0.0.0.0")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Each worker is a process with its own embedder and LLM client; the index
+# files are opened with mmap, so their pages are shared through the page cache
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+# Seconds a worker may take to import and start answering uvicorn's health
+# checks; model loading starts in the background and competes for the CPU
+API_WORKER_STARTUP_TIMEOUT = int(os.getenv("API_WORKER_STARTUP_TIMEOUT", "60"))
+# Mount the Gradio UI (app.py) at /ui; worker processes read it from the environment
+API_UI = os.getenv("API_UI", "0") == "1"
+# Longest a request waits for the background warmup before a 503
+API_READY_TIMEOUT = float(os.getenv("API_READY_TIMEOUT", "30"))
+# Sent with 503s when the LLM queue is full
+RETRY_AFTER_SECONDS = 2
+# With several workers each one dumps its metrics here every
+# API_METRICS_INTERVAL seconds and /metrics merges them; main() sets it,
+# set it yourself when starting uvicorn api:app --workers N directly
+API_METRICS_DIR = os.getenv("API_METRICS_DIR", "")
+API_METRICS_INTERVAL = float(os.getenv("API_METRICS_INTERVAL", "5"))
+
+logger = logging.getLogger(__name__)
+
+FilterValue = Union[str, int, List[Union[str, int]], None]
+
+
+class AnswerFilters(BaseModel):
+    """Metadata filters (see metadata_filter); a list matches any of its values."""
+
+    model_config = ConfigDict(extra="forbid")
+
+    source_type: Optional[str] = Field(None, description='"kanun" or "genelge"')
+    genelge_no: FilterValue = None
+    madde_no: FilterValue = None
+    kisim: FilterValue = None
+    bolum: FilterValue = None
+
+
+class AnswerRequest(BaseModel):
+    question: str = Field(min_length=1, max_length=2000)
+    filters: Optional[AnswerFilters] = None
+
+
+class Source(BaseModel):
+    source_type: Optional[str] = None
+    madde_no: Optional[str] = None
+    genelge_no: Optional[str] = None
+    full_path: Optional[str] = None
+    kisim: Optional[str] = None
+    bolum: Optional[str] = None
+    chunk_id: Optional[str] = None
+    title: str
+    text: str
+
+
+class AnswerResponse(BaseModel):
+    question: str
+    answer: str
+    sources: List[Source]
+    cached: Optional[str] = Field(None, description='"exact" or "semantic" for answer cache hits')
+    context_tokens: int
+    timings_ms: Dict[str, float]
+
+
+def _filters(request: AnswerRequest) -> Optional[Dict]:
+    return request.filters.model_dump() if request.filters is not None else None
+
+
+async def _ensure_ready():
+    if not await rag_service.wait_until_ready(API_READY_TIMEOUT):
+        raise HTTPException(503, detail=f"RAG system is {rag.get_startup_status().replace('_', ' ')}")
+
+
+def _busy(error: Exception) -> HTTPException:
+    return HTTPException(
+        503, detail=str(error) or "LLM queue is full", headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+def _sse(event: Dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    rag.configure_logging()
+    # Every worker loads the models and opens the index in the background
+    rag.start_warmup()
+    if API_METRICS_DIR:
+        remove_stale_dumps(API_METRICS_DIR)
+        start_metrics_dumper(API_METRICS_DIR, API_METRICS_INTERVAL)
+    yield
+    rag.flush_answer_cache()
+    if API_METRICS_DIR:
+        REGISTRY.dump(API_METRICS_DIR)
+
+
+def create_app(mount_ui: bool = API_UI) -> FastAPI:
+    """
+    JSON API over rag_service: POST /v1/answer, POST /v1/answer/stream (SSE),
+    GET /v1/filters/{field}, /health, /ready and /metrics; the Gradio UI is
+    mounted at /ui when mount_ui is set and gradio is installed.
+    """
+    app = FastAPI(title="NoterLLM API", lifespan=lifespan)
+
+    @app.get("/health")
+    async def health() -> Dict:
+        return rag_service.status()
+
+    @app.get("/ready")
+    async def ready() -> Dict:
+        if not rag.is_ready():
+            raise HTTPException(503, detail=rag.get_startup_status())
+        return {"ready": True}
+
+    @app.post("/v1/answer", response_model=AnswerResponse)
+    async def answer(request: AnswerRequest) -> Dict:
+        await _ensure_ready()
+        try:
+            payload = await rag_service.answer(request.question, _filters(request))
+        except (QueueFullError, QueueTimeoutError) as e:
+            raise _busy(e)
+        if payload is None:
+            raise HTTPException(500, detail="The question could not be answered, see the server log")
+        return payload
+
+    @app.post("/v1/answer/stream")
+    async def answer_stream(request: AnswerRequest) -> StreamingResponse:
+        """Server-sent events: "token" events, then one "done" event (an AnswerResponse) or "error"."""
+        await _ensure_ready()
+
+        async def events() -> AsyncIterator[str]:
+            async for event in rag_service.stream_answer(request.question, _filters(request)):
+                yield _sse(event)
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/v1/filters/{field}")
+    async def filter_values(field: str) -> Dict:
+        if field not in FILTER_FIELDS:
+            raise HTTPException(404, detail=f"Unknown filter field {field}, expected one of {', '.join(FILTER_FIELDS)}")
+        return {"field": field, "values": rag.get_filter_values(field)}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics() -> PlainTextResponse:
+        # Whichever worker answers reports the sum over all of them
+        body = REGISTRY.render_merged(API_METRICS_DIR) if API_METRICS_DIR else REGISTRY.render()
+        return PlainTextResponse(body, media_type=CONTENT_TYPE)
+
+    if mount_ui:
+        try:
+            import gradio as gr
+
+            from app import demo
+        except ImportError as e:
+            logger.warning("⚠️  Gradio UI not mounted: %s", e)
+        else:
+            app = gr.mount_gradio_app(app, demo, path="/ui")
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NoterLLM JSON API (uvicorn)")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    parser.add_argument("--ui", action="store_true", help="Also serve the Gradio UI at /ui")
+    args = parser.parse_args()
+    rag.configure_logging()
+
+    import uvicorn
+
+    if args.workers > 1:
+        # Workers drop earlier runs' dumps at startup, so counters restart with the server
+        metrics_dir = API_METRICS_DIR or os.path.join(tempfile.gettempdir(), f"noterllm_metrics_{args.port}")
+        os.environ["API_METRICS_DIR"] = metrics_dir
+    if args.ui:
+        os.environ["API_UI"] = "1"
+        if args.workers > 1:
+            # Gradio keeps session state in the process that served the page
+            logger.warning("⚠️  The Gradio UI needs sticky sessions with more than one worker")
+    logger.info("🚀 NoterLLM API on http://%s:%s (%s workers)", args.host, args.port, args.workers)
+    uvicorn.run(
+        "api:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_worker_healthcheck=API_WORKER_STARTUP_TIMEOUT,
+        log_level=rag.LOG_LEVEL.lower(),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,26 @@
+import logging
+
 import gradio as gr
-from llm_rag_setup import query_rag, init_rag
 
-print("🚀 Initializing RAG system at startup...")
-init_rag()
-print("✅ RAG system ready!")
+import rag_service
+from llm_rag_setup import (
+    METRICS_PORT,
+    configure_logging,
+    get_filter_values,
+    get_startup_status,
+    is_ready,
+    start_warmup,
+)
+from metrics import start_metrics_server
+
+# Longest a question waits for the background warmup before giving up
+STARTUP_WAIT_TIMEOUT = 600
+
+logger = logging.getLogger(__name__)
+
+# Also when the UI is mounted by api.py
+logger.info("🚀 Warming up RAG system in the background...")
+start_warmup()
 
 custom_css = """
 .container {
@@ -87,31 +104,20 @@ custom_css = """
 """
 
 
-def format_sources(source_documents):
-    if not source_documents:
+def format_sources(sources):
+    """HTML for the first three sources of a structured answer (rag_service.source_info dicts)."""
+    if not sources:
         return ""
 
     sources_html = ""
-    for i, doc in enumerate(source_documents[:3], 1):
-        metadata = doc.metadata
-        source_type = metadata.get("source_type", "genelge")
-
-        if source_type == "kanun":
-            madde_no = metadata.get("madde_no", "N/A")
-            madde_baslik = metadata.get("madde_baslik", "")
-            title = f"📜 Noterlik Kanunu - Madde {madde_no}"
-            if madde_baslik:
-                title += f" ({madde_baslik})"
-            kisim = metadata.get("kisim", "")
-            content = f"{kisim}\n\n{doc.page_content[:200]}..."
+    for i, source in enumerate(sources[:3], 1):
+        text = source["text"]
+        if source["source_type"] == "kanun":
+            title = f"📜 {source['title']}"
+            content = f"{source['kisim'] or ''}\n\n{text[:200]}..."
         else:
-            genelge_no = metadata.get("genelge_no", "N/A")
-            madde_no = metadata.get("madde_no", "N/A")
-            title = f"📋 Genelge {genelge_no} - Madde {madde_no}"
-            genelge_baslik = metadata.get("genelge_baslik", "N/A")
-            content = doc.page_content[:500] + (
-                "..." if len(doc.page_content) > 500 else ""
-            )
+            title = f"📋 {source['title']}"
+            content = text[:500] + ("..." if len(text) > 500 else "")
 
         sources_html += f"""
 <div class="source-box">
@@ -124,7 +130,7 @@ def format_sources(source_documents):
     return f"""
 <br>
 <details class="sources-details">
-    <summary>📚 Kaynaklar ({len(source_documents[:3])} kaynak)</summary>
+    <summary>📚 Kaynaklar ({len(sources[:3])} kaynak)</summary>
     <div class="sources-container">
         {sources_html}
     </div>
@@ -132,36 +138,86 @@ def format_sources(source_documents):
 """
 
 
-def chat_with_rag(message, history):
-    if not message.strip():
-        return "", history
+def build_filters(source_type, genelge_no, madde_no, kisim, bolum):
+    """Filter controls -> query_rag filters; empty controls don't restrict anything."""
+    return {
+        "source_type": source_type,
+        "genelge_no": genelge_no,
+        "madde_no": [m.strip() for m in (madde_no or "").split(",") if m.strip()],
+        "kisim": kisim,
+        "bolum": bolum,
+    }
 
-    try:
-        result = query_rag(message)
-        if result is None:
-            answer = "❌ Sistem başlatılamadı veya veri eksik. Lütfen sunucu günlüklerini kontrol edin."
-        else:
-            answer = result.get("result", "(Cevap alınamadı)")
 
-        sources_html = ""
-        if result and "source_documents" in result and result["source_documents"]:
-            sources_html = format_sources(result["source_documents"])
+async def chat_with_rag(message, history, source_type="", genelge_no=None, madde_no="", kisim=None, bolum=None):
+    if not message.strip():
+        yield "", history
+        return
 
-        full_response = answer + sources_html
-        history.append((message, full_response))
+    if not is_ready():
+        history.append((message, "⏳ Sistem hazırlanıyor, sorunuz hazır olunca yanıtlanacak..."))
+        yield "", history
+        if not await rag_service.wait_until_ready(timeout=STARTUP_WAIT_TIMEOUT):
+            history[-1] = (
+                message,
+                "❌ Sistem başlatılamadı veya veri eksik. Lütfen sunucu günlüklerini kontrol edin.",
+            )
+            yield "", history
+            return
+        history[-1] = (message, "")
+    else:
+        history.append((message, ""))
+    yield "", history
 
-        return "", history
+    try:
+        answer = ""
+        filters = build_filters(source_type, genelge_no, madde_no, kisim, bolum)
+        async for event in rag_service.stream_answer(message, filters):
+            if event["type"] == "token":
+                answer += event["text"]
+                history[-1] = (message, answer)
+                yield "", history
+            elif event["type"] == "done":
+                answer = event["answer"] or "(Cevap alınamadı)"
+                history[-1] = (message, answer + format_sources(event["sources"]))
+                yield "", history
+            elif event.get("busy"):
+                history[-1] = (message, "⏳ Sistem şu anda yoğun, lütfen biraz sonra tekrar deneyin.")
+                yield "", history
+            elif event["type"] == "error":
+                history[-1] = (
+                    message,
+                    "❌ Sistem başlatılamadı veya veri eksik. Lütfen sunucu günlüklerini kontrol edin.",
+                )
+                yield "", history
 
     except Exception as e:
         error_message = f"❌ Hata oluştu: {str(e)}"
-        history.append((message, error_message))
-        return "", history
+        history[-1] = (message, error_message)
+        yield "", history
 
 
 def clear_chat():
     return [], []
 
 
+def startup_status():
+    status = get_startup_status()
+    # Filter choices come from the index, so they are filled in once it is loaded
+    choices = [gr.update()] * len(FILTER_CHOICE_FIELDS)
+    if status == "warming_up":
+        text = "⏳ **Sistem hazırlanıyor...** İndeks ve embedding modeli arka planda yükleniyor."
+    elif status == "ready":
+        text = "✅ Sistem hazır"
+        choices = [gr.update(choices=get_filter_values(field)) for field in FILTER_CHOICE_FIELDS]
+    else:
+        text = "❌ Sistem başlatılamadı. Lütfen sunucu günlüklerini kontrol edin."
+    # Stop polling once warmup is over
+    return text, gr.Timer(active=status == "warming_up"), *choices
+
+
+FILTER_CHOICE_FIELDS = ("genelge_no", "kisim", "bolum")
+
 examples = [
     "Araç satış işlemlerinde hangi belgeler gereklidir?",
     "Noterlik işlemlerinde harç ve karar pulu nasıl hesaplanır?",
@@ -185,6 +241,9 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as demo:
         """
     )
 
+    status_box = gr.Markdown()
+    status_timer = gr.Timer(1.0)
+
     with gr.Row():
         with gr.Column(scale=4):
             chatbot = gr.Chatbot(
@@ -225,15 +284,28 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as demo:
                 """
             )
 
+            with gr.Accordion("🔎 Filtreler (isteğe bağlı)", open=False):
+                source_filter = gr.Dropdown(
+                    choices=[("Tümü", ""), ("Noterlik Kanunu", "kanun"), ("Genelgeler", "genelge")],
+                    value="",
+                    label="Kaynak",
+                )
+                genelge_filter = gr.Dropdown(choices=[], multiselect=True, label="Genelge No")
+                madde_filter = gr.Textbox(label="Madde No", placeholder="ör. 60 veya 60, 61")
+                kisim_filter = gr.Dropdown(choices=[], multiselect=True, label="Kısım")
+                bolum_filter = gr.Dropdown(choices=[], multiselect=True, label="Bölüm")
+
+    filter_inputs = [source_filter, genelge_filter, madde_filter, kisim_filter, bolum_filter]
+
     submit_btn.click(
         fn=chat_with_rag,
-        inputs=[msg, chatbot],
+        inputs=[msg, chatbot, *filter_inputs],
         outputs=[msg, chatbot],
     )
 
     msg.submit(
         fn=chat_with_rag,
-        inputs=[msg, chatbot],
+        inputs=[msg, chatbot, *filter_inputs],
         outputs=[msg, chatbot],
     )
 
@@ -243,4 +315,15 @@ with gr.Blocks(css=custom_css, theme=gr.themes.Soft()) as demo:
         outputs=[msg, chatbot],
     )
 
-demo.launch()
+    status_outputs = [status_box, status_timer, genelge_filter, kisim_filter, bolum_filter]
+    demo.load(fn=startup_status, inputs=None, outputs=status_outputs)
+    status_timer.tick(fn=startup_status, inputs=None, outputs=status_outputs)
+
+if __name__ == "__main__":
+    configure_logging()
+    if METRICS_PORT:
+        try:
+            logger.info("📈 Metrics at %s", start_metrics_server(port=METRICS_PORT).url)
+        except OSError as e:
+            logger.warning("⚠️  Metrics server could not start on port %s: %s", METRICS_PORT, e)
+    demo.launch()
@@ -0,0 +1,155 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metadata_filter import FilterIndex
+from turkish_analyzer import turkish_lower
+
+# (source_type, genelge_no or "", madde_no)
+ArticleKey = Tuple[str, str, str]
+
+_MADDE_NO = r"\d+(?:/[a-z])?"
+_MADDE_LIST = rf"({_MADDE_NO}(?:\s*(?:,|ve|ile|veya)\s*{_MADDE_NO})*)"
+_ORDINAL = r"(?:\.|['’]?\s*(?:inci|ıncı|uncu|üncü|nci|ncı|ncu|ncü))"
+# "madde 60", "maddesi 61/A", "md. 60", "madde 60 ve 61"
+_MADDE_RE = re.compile(rf"\b(?:madde(?:ler)?(?:si|i|nin)?|md\.?)\s*{_MADDE_LIST}")
+_ORDINAL_ITEM = rf"{_MADDE_NO}(?:\s*{_ORDINAL})?"
+# The last number needs an ordinal, a sub-article or a possessive "maddesi"
+_ORDINAL_LAST = rf"(?:{_MADDE_NO}\s*{_ORDINAL}\s*madde|\d+/[a-z]\s*madde|\d+\s*madde(?:si|sinde|leri)\b)"
+# "60. madde", "61/A maddesi", "60 ıncı madde", "60 ve 61. maddeleri"
+_ORDINAL_MADDE_RE = re.compile(rf"\b(?:{_ORDINAL_ITEM}\s*(?:,|ve|ile|veya)\s*)*{_ORDINAL_LAST}")
+# "genelge 112", "genelge no: 112", "112 sayılı genelge"; not the "3" of
+# "genelgenin 3 üncü maddesi" or "genelgenin 3 maddesi"
+_GENELGE_RE = re.compile(
+    rf"\bgenelge(?:si|nin)?\s*(?:no\.?|numara(?:sı)?|sayı(?:sı)?)?\s*:?\s*(\d+)\b"
+    rf"(?!\s*{_ORDINAL}\s*madde|\s*madde(?:si|sinde)\b)"
+)
+_NUMBERED_GENELGE_RE = re.compile(r"\b(\d+)\s*(?:no\.?|nolu|numaralı|sayılı)\s*genelge")
+_KANUN_RE = re.compile(r"\bkanun|\b1512\b")
+_LIST_SPLIT_RE = re.compile(r"\s*(?:,|ve|ile|veya)\s*")
+_MADDE_NO_RE = re.compile(_MADDE_NO)
+_MADDE_WORD_RE = re.compile(r"^(?:madde|md\b)")
+
+
+@dataclass
+class ArticleQuery:
+    """
+    Provisions a question names explicitly.
+
+    refs are the articles to fetch directly; unambiguous means the source
+    of every one of them is stated (the Kanun or a single genelge), so the
+    dense leg can be skipped when they are all found. genelge_scope lists
+    genelge numbers named without an article, which scope retrieval instead.
+    """
+
+    refs: List[ArticleKey] = field(default_factory=list)
+    genelge_scope: List[str] = field(default_factory=list)
+    unambiguous: bool = False
+
+
+def article_key(source_type: Optional[str], genelge_no, madde_no) -> Optional[ArticleKey]:
+    """Key of the article a chunk belongs to, None for chunks without a madde number."""
+    if madde_no in (None, ""):
+        return None
+    source = str(source_type or "genelge").strip()
+    genelge = str(genelge_no).strip() if source == "genelge" and genelge_no not in (None, "") else ""
+    return (source, genelge, str(madde_no).strip().upper())
+
+
+def _unique(values: Sequence[str]) -> List[str]:
+    return list(dict.fromkeys(values))
+
+
+def _has_stray_numbers(text: str, known: Sequence[str]) -> bool:
+    """Whether a number next to a "madde" word is none of the known madde / source numbers."""
+    words = text.split()
+    for i, word in enumerate(words):
+        if not _MADDE_WORD_RE.match(word):
+            continue
+        for neighbour in words[max(i - 3, 0) : i + 3]:
+            if any(number not in known for number in _MADDE_NO_RE.findall(neighbour)):
+                return True
+    return False
+
+
+def parse_references(question: str) -> ArticleQuery:
+    """
+    Each article number belongs to the source named closest before it
+    ("Genelge 112 madde 3", "1512 sayılı Kanunun 60. maddesi"), or after it
+    when nothing precedes ("Madde 60 Noterlik Kanunu").
+    """
+    text = turkish_lower(question)
+
+    # (position, genelge number or "" for the Kanun)
+    sources = [(m.start(), "") for m in _KANUN_RE.finditer(text)]
+    sources += [(m.start(), m.group(1)) for m in _GENELGE_RE.finditer(text)]
+    sources += [(m.start(), m.group(1)) for m in _NUMBERED_GENELGE_RE.finditer(text)]
+    sources.sort()
+
+    maddeler = [
+        (m.start(), madde)
+        for m in _MADDE_RE.finditer(text)
+        for madde in _LIST_SPLIT_RE.split(m.group(1))
+    ]
+    maddeler += [
+        (m.start(), madde) for m in _ORDINAL_MADDE_RE.finditer(text) for madde in _MADDE_NO_RE.findall(m.group(0))
+    ]
+
+    refs, unambiguous, cited = [], True, set()
+    for position, madde in sorted(maddeler):
+        before = [source for pos, source in sources if pos < position]
+        after = [source for pos, source in sources if pos > position]
+        source = before[-1] if before else after[0] if after else None
+        if source is None:
+            # A bare "Madde 60" most likely means the Kanun, but genelgeler
+            # number their articles too, so the dense leg still runs
+            unambiguous = False
+            source = ""
+        cited.add(source)
+        refs.append(("genelge", source, madde.upper()) if source else ("kanun", "", madde.upper()))
+
+    # A number the patterns missed ("60'ıncı ve 61. maddeler") may be an article
+    # that the lookup can't fetch, so the dense leg has to run
+    known = {madde for _, madde in maddeler} | {source for _, source in sources} | {"1512"}
+    if _has_stray_numbers(text, known):
+        unambiguous = False
+
+    scope = _unique(source for _, source in sources if source and source not in cited)
+    return ArticleQuery(refs=_unique(refs), genelge_scope=scope, unambiguous=bool(refs) and unambiguous)
+
+
+class ArticleIndex:
+    """(source_type, genelge_no, madde_no) -> chunk_ids, in document order."""
+
+    def __init__(self, articles: Dict[ArticleKey, List[str]]):
+        self.articles = articles
+        self.genelgeler = {genelge for source, genelge, _ in articles if source == "genelge"}
+
+    @classmethod
+    def from_filter_index(cls, filters: FilterIndex, chunk_ids: Sequence[str]) -> "ArticleIndex":
+        articles: Dict[ArticleKey, List[str]] = {}
+        columns = zip(
+            filters.row_values("source_type"),
+            filters.row_values("genelge_no"),
+            filters.row_values("madde_no"),
+            chunk_ids,
+        )
+        for source, genelge, madde, chunk_id in columns:
+            key = article_key(source, genelge, madde)
+            if key is not None:
+                articles.setdefault(key, []).append(str(chunk_id))
+        return cls(articles)
+
+    def lookup(self, query: ArticleQuery) -> Tuple[List[str], bool]:
+        """Chunk ids of every referenced article and whether all of them were found."""
+        chunk_ids, found_all = [], True
+        for ref in query.refs:
+            found = self.articles.get(ref)
+            if found is None:
+                found_all = False
+            else:
+                chunk_ids.extend(found)
+        return _unique(chunk_ids), found_all and bool(query.refs)
+
+    def known_genelgeler(self, genelge_nos: Sequence[str]) -> List[str]:
+        return [g for g in genelge_nos if g in self.genelgeler]
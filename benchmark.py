@@ -0,0 +1,272 @@
+import argparse
+import ast
+import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+import llm_rag_setup as rag
+
+STAGES = ["lookup", "embed", "faiss", "bm25", "fusion", "rerank", "prompt_build", "ttft", "generation", "total"]
+
+
+def load_example_questions(path: str = "example_questions.txt") -> Dict[str, List[str]]:
+    """Parse example_questions.txt into {"Basit": [...], "Orta": [...], "İleri": [...]}."""
+    sections: Dict[str, List[str]] = {}
+    current = None
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("-"):
+                current = line.split()[0]
+                sections[current] = []
+                continue
+            question = line.lstrip("- ").strip()
+            # Section notes are bullets too, only keep actual questions
+            if current is not None and question.endswith("?"):
+                sections[current].append(question)
+
+    return sections
+
+
+def load_app_examples(path: str = "app.py") -> List[str]:
+    # Read the list literal instead of importing app.py, which starts the UI
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(t, ast.Name) and t.id == "examples" for t in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    return []
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_query(question: str, generate: bool, stream: bool = False) -> Dict:
+    if generate and stream:
+        result = None
+        for event in rag.stream_rag(question):
+            if event["type"] == "done":
+                result = event
+    else:
+        result = rag.query_rag(question) if generate else rag.retrieve_context(question)
+    if result is None:
+        raise RuntimeError(f"Query failed: {question}")
+    return result
+
+
+def stage_latencies(questions: List[str], generate: bool, repeats: int, stream: bool = False) -> Dict:
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    for _ in range(repeats):
+        for question in questions:
+            timings = run_query(question, generate, stream)["timings"]
+            for stage in STAGES:
+                if stage in timings:
+                    samples[stage].append(timings[stage])
+    return {stage: percentiles(values) for stage, values in samples.items() if values}
+
+
+def prompt_sizes(questions: List[str]) -> Dict[str, float]:
+    """Context tokens (as counted by the packer) and prompt characters per question."""
+    results = [run_query(question, False) for question in questions]
+    tokens = np.array([result.get("context_tokens", 0) for result in results])
+    chars = np.array([len(result["prompt"]) for result in results])
+    return {
+        "mean_context_tokens": float(tokens.mean()),
+        "p95_context_tokens": float(np.percentile(tokens, 95)),
+        "mean_prompt_chars": float(chars.mean()),
+        "p95_prompt_chars": float(np.percentile(chars, 95)),
+    }
+
+
+def throughput(questions: List[str], generate: bool, concurrency: int, repeats: int, stream: bool = False) -> Dict:
+    workload = questions * repeats
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        totals = list(pool.map(lambda q: run_query(q, generate, stream)["timings"]["total"], workload))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "queries": len(workload),
+        "wall_s": wall,
+        "qps": len(workload) / wall if wall else 0.0,
+        "latency": percentiles(totals),
+    }
+
+
+def start_standin(args) -> str:
+    from standin_llm_server import StandInConfig, start_standin_server
+
+    config = StandInConfig(
+        ttft=args.ttft,
+        token_latency=args.token_latency,
+        prefill_per_1k_chars=args.prefill_per_1k_chars,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        straggler_rate=args.straggler_rate,
+        straggler_delay=args.straggler_delay,
+    )
+    server = start_standin_server(config=config)
+    print(f"✅ Stand-in LLM on {server.url} ({config})")
+    return server.url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NoterLLM retrieval / end-to-end latency benchmark")
+    parser.add_argument("--questions", default="example_questions.txt")
+    parser.add_argument("--generate", action="store_true", help="Also run generation (see --llm)")
+    parser.add_argument("--stream", action="store_true", help="Generate through stream_rag and report TTFT")
+    parser.add_argument(
+        "--llm",
+        default="fake",
+        choices=["fake", "stand-in", "hf-endpoint", "llama-cpp"],
+        help='"fake": in-process canned answer; "stand-in": standin_llm_server.py over HTTP '
+        "(started here unless --llm-endpoint is given); the others use llm_rag_setup settings",
+    )
+    parser.add_argument("--llm-endpoint", default=None, help="URL of a running stand-in / TGI server")
+    parser.add_argument("--stub-response-chars", type=int, default=400, help="Answer length of --llm fake")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Stand-in time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Stand-in seconds per token")
+    parser.add_argument("--prefill-per-1k-chars", type=float, default=0.0, help="Stand-in TTFT per 1000 prompt chars")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Stand-in answer length")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Stand-in share of 503 answers")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Stand-in share of delayed answers")
+    parser.add_argument("--straggler-delay", type=float, default=1.0, help="Stand-in straggler delay (s)")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow generation requests")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--with-answer-cache", action="store_true")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    rag.configure_logging()
+
+    sections = load_example_questions(args.questions)
+    sections["app_examples"] = load_app_examples()
+
+    if not args.with_answer_cache:
+        rag.ANSWER_CACHE_ENABLED = False
+    if args.hedge:
+        rag.LLM_HEDGE = True
+
+    llm, llm_backend = None, args.llm
+    if args.llm == "fake":
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+        llm = FakeListChatModel(responses=["Noterlik Kanunu Madde 60'a göre " + "x" * args.stub_response_chars])
+    elif args.llm == "stand-in":
+        rag.LLM_ENDPOINT_URL = args.llm_endpoint or start_standin(args)
+
+    init_started = time.perf_counter()
+    rag.init_rag(llm=llm, llm_backend=llm_backend)
+    init_time = time.perf_counter() - init_started
+
+    all_questions = [q for questions in sections.values() for q in questions]
+    # Also warms up model caches so the first measured query isn't an outlier
+    if rag.retrieve_context(all_questions[0]) is None:
+        print("❌ RAG system could not be initialized")
+        sys.exit(1)
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "generate": args.generate,
+        "llm": args.llm,
+        "stream": args.stream,
+        "repeats": args.repeats,
+        "init_s": init_time,
+        "sections": {},
+        "overall": stage_latencies(all_questions, args.generate, args.repeats, args.stream),
+        "throughput": [],
+    }
+
+    for name, questions in sections.items():
+        if questions:
+            report["sections"][name] = stage_latencies(questions, args.generate, args.repeats, args.stream)
+
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        report["throughput"].append(throughput(all_questions, args.generate, concurrency, args.repeats, args.stream))
+
+    report["prompt_size"] = prompt_sizes(all_questions)
+    report["retriever_latency"] = rag.get_retrieval_stats()
+    report["query_batching"] = rag.get_query_batch_stats()
+    report["rerank"] = rag.get_rerank_stats()
+    report["generation_client"] = rag.get_generation_stats()
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    print("\n📊 Aşama gecikmeleri (tüm sorular)")
+    for stage, stats in report["overall"].items():
+        print(
+            f"  {stage:<13} p50 {stats['p50_ms']:8.2f} ms   p95 {stats['p95_ms']:8.2f} ms   "
+            f"p99 {stats['p99_ms']:8.2f} ms"
+        )
+    size = report["prompt_size"]
+    print(
+        f"\n📏 Bağlam: ortalama {size['mean_context_tokens']:.0f} token (p95 {size['p95_context_tokens']:.0f}), "
+        f"prompt ortalama {size['mean_prompt_chars']:.0f} karakter"
+    )
+    print("\n📊 Eşzamanlılık")
+    for row in report["throughput"]:
+        print(f"  {row['concurrency']:>3} iş parçacığı: {row['qps']:7.2f} QPS, p95 {row['latency']['p95_ms']:.1f} ms")
+    batching = report["query_batching"]
+    if batching:
+        print(
+            f"\n📦 Sorgu batch'leme: {batching['queries']} sorgu, {batching['batches']} batch "
+            f"(ortalama {batching['mean_batch_size']:.2f}), boyutlar {batching['batch_sizes']}"
+        )
+        print(f"  bekleme: {batching['wait_ms']}")
+    rerank = report["rerank"]
+    if rerank:
+        print(
+            f"\n🔀 Rerank: {rerank['reranked']} sorgu, {rerank['partial']} kısmi, "
+            f"{rerank['fallbacks']} süre aşımı (füzyon sırası)"
+        )
+    client = report["generation_client"]
+    if client:
+        print(
+            f"\n🔌 Üretim istemcisi: {client['requests']} istek, {client['attempts']} deneme, "
+            f"{client['retries']} tekrar {client['retry_reasons']}, {client['failures']} hata, "
+            f"{client['hedges']} hedge ({client['hedge_wins']} kazandı)"
+        )
+        print(
+            f"  bağlantı: {client['connections_opened']} açıldı, {client['connections_reused']} yeniden kullanıldı "
+            f"{client['http_versions']}, devre kesici {client['breaker']['state']}"
+        )
+    print(f"\n💾 Peak RSS: {report['peak_rss_mb']:.0f} MB")
+
+    output = args.output or os.path.join(
+        "benchmark_results", f"bench_{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"✅ Sonuçlar {output} dosyasına kaydedildi")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import json
+import struct
+import zipfile
+from collections import Counter
+from collections.abc import Mapping
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, InstanceOf
+from scipy import sparse
+
+BM25_FORMAT_VERSION = 1
+
+
+def default_tokenize(text: str) -> List[str]:
+    # Same as rank_bm25 / BM25Retriever default preprocessing
+    return text.split()
+
+
+def _mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """
+    Open every member of an uncompressed .npz as a read-only memmap.
+    np.load ignores mmap_mode for .npz files, so the .npy headers are parsed
+    here and the arrays are mapped straight out of the zip container.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_len, extra_len = struct.unpack("<HH", local_header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject:
+                raise ValueError(f"{path}:{name} contains Python objects")
+            if not shape or 0 in shape:
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member, allow_pickle=False)
+                continue
+
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=f.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a CSR term-document matrix of precomputed term weights.
+
+    Row t holds idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+    for every document containing t, so scoring a query is a sparse row
+    selection and a mat-vec. Scores match rank_bm25's BM25Okapi.
+    """
+
+    def __init__(
+        self,
+        weights: sparse.csr_matrix,
+        vocab: np.ndarray,
+        doc_ids: np.ndarray,
+        params: Dict,
+    ):
+        self.weights = weights
+        self.vocab = vocab
+        self.doc_ids = doc_ids
+        self.params = params
+
+    @property
+    def doc_count(self) -> int:
+        return self.weights.shape[1]
+
+    @classmethod
+    def build(
+        cls,
+        token_lists: Sequence[List[str]],
+        doc_ids: Sequence[str],
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        params: Optional[Dict] = None,
+    ) -> "BM25Index":
+        doc_count = len(token_lists)
+        term_freqs = [Counter(tokens) for tokens in token_lists]
+        doc_lens = np.array([len(tokens) for tokens in token_lists], dtype=np.float32)
+        avgdl = float(doc_lens.mean()) if doc_count else 0.0
+
+        vocab = np.array(sorted({t for tf in term_freqs for t in tf}))
+        term_ids = {term: i for i, term in enumerate(vocab.tolist())}
+
+        rows, cols, tfs = [], [], []
+        for doc_no, tf in enumerate(term_freqs):
+            for term, count in tf.items():
+                rows.append(term_ids[term])
+                cols.append(doc_no)
+                tfs.append(count)
+        rows = np.array(rows, dtype=np.int32)
+        cols = np.array(cols, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+
+        df = np.bincount(rows, minlength=len(vocab)).astype(np.float64)
+        idf = np.log(doc_count - df + 0.5) - np.log(df + 0.5)
+        # BM25Okapi floors negative idf values at epsilon * average idf
+        if len(idf):
+            idf[idf < 0] = epsilon * idf.mean()
+
+        norm = k1 * (1 - b + b * doc_lens[cols] / avgdl) if avgdl else k1
+        data = (idf[rows] * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32)
+
+        weights = sparse.csr_matrix(
+            (data, (rows, cols)), shape=(len(vocab), doc_count), dtype=np.float32
+        )
+        weights.sort_indices()
+
+        all_params = {"k1": k1, "b": b, "epsilon": epsilon, "avgdl": avgdl}
+        all_params.update(params or {})
+        return cls(weights, vocab, np.array(list(doc_ids)), all_params)
+
+    def term_ids(self, tokens: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        if not tokens or not len(self.vocab):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        terms, counts = np.unique(np.array(tokens), return_counts=True)
+        positions = np.searchsorted(self.vocab, terms)
+        positions = np.minimum(positions, len(self.vocab) - 1)
+        known = self.vocab[positions] == terms
+        return positions[known], counts[known].astype(np.float32)
+
+    def scores(self, tokens: List[str]) -> np.ndarray:
+        ids, counts = self.term_ids(tokens)
+        if not len(ids):
+            return np.zeros(self.doc_count, dtype=np.float32)
+        return np.asarray(self.weights[ids].T @ counts).ravel()
+
+    def search(
+        self, tokens: List[str], k: int, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
+        """Top k document columns; allowed optionally restricts the candidates (boolean mask)."""
+        scores = self.scores(tokens)
+        if allowed is None:
+            return top_k(scores, k)
+        columns = np.flatnonzero(allowed)
+        return [(int(columns[i]), score) for i, score in top_k(scores[columns], k)]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {
+            "data": self.weights.data,
+            "indices": self.weights.indices,
+            "indptr": self.weights.indptr,
+            "vocab": self.vocab,
+            "doc_ids": self.doc_ids,
+            "meta": np.array(
+                json.dumps(
+                    {
+                        "version": BM25_FORMAT_VERSION,
+                        "shape": list(self.weights.shape),
+                        "params": self.params,
+                    },
+                    ensure_ascii=False,
+                )
+            ),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "BM25Index":
+        meta = json.loads(str(arrays["meta"]))
+        if meta.get("version") != BM25_FORMAT_VERSION:
+            raise ValueError("Unsupported BM25 index version")
+
+        weights = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=tuple(meta["shape"]),
+            copy=False,
+        )
+        return cls(weights, arrays["vocab"], arrays["doc_ids"], meta["params"])
+
+    def save(self, path: str):
+        np.savez(path, **self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        return cls.from_arrays(_mmap_npz(path))
+
+
+def top_k(scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    if k <= 0 or not len(scores):
+        return []
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(i), float(scores[i])) for i in ordered]
+
+
+class BM25IndexRetriever(BaseRetriever):
+    """Drop-in replacement for BM25Retriever backed by a BM25Index."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: BM25Index
+    # dict or ChunkStore; InstanceOf keeps pydantic from copying it into a dict
+    docstore: InstanceOf[Mapping]
+    preprocess_func: Callable[[str], List[str]] = default_tokenize
+    k: int = 5
+
+    def search_with_scores(
+        self, query: str, k: Optional[int] = None, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[Document, float]]:
+        hits = self.index.search(self.preprocess_func(query), k or self.k, allowed)
+        return [(self.docstore[str(self.index.doc_ids[i])], score) for i, score in hits]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query)]
@@ -0,0 +1,179 @@
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+from article_lookup import ArticleIndex, ArticleKey, article_key
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# Between articles, as the "stuff" chain joined documents
+ARTICLE_SEPARATOR = "\n---\n"
+# Between the header lines and the text of a chunk (see _create_hierarchical_content)
+HEADER_SEPARATOR = "\n---\n"
+# Between two retrieved chunks of an article that are not neighbours
+GAP_MARKER = "\n[...]\n"
+# split_madde_content carries the last 200 characters into the next chunk;
+# strip() can shave a little off either side
+MAX_OVERLAP = 250
+MIN_OVERLAP = 20
+# Kanun headers carry the whole kısım heading trail on one line, often
+# thousands of characters; the citation lines (source, madde) are short
+MAX_HEADER_LINE = 160
+
+TokenCounter = Callable[[str], int]
+
+
+def load_token_counter(tokenizer_name: str) -> TokenCounter:
+    """
+    Token count of a text under the LLM's tokenizer, or a characters / 3
+    estimate (about what Qwen gives on Turkish legal text) when it can't be loaded.
+    """
+    try:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+    except Exception as e:
+        logger.warning("⚠️  Tokenizer %s unavailable, estimating tokens from length: %s", tokenizer_name, e)
+        return lambda text: len(text) // 3 + 1
+
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def split_header(content: str) -> Tuple[str, str]:
+    """
+    (hierarchical header with over-long lines shortened, chunk text); the
+    header is empty for chunks without one.
+    """
+    header, separator, body = content.partition(HEADER_SEPARATOR)
+    if not separator:
+        return "", content
+    lines = [line if len(line) <= MAX_HEADER_LINE else line[:MAX_HEADER_LINE].rstrip() + " …" for line in header.split("\n")]
+    return "\n".join(lines), body
+
+
+def overlap_length(previous: str, following: str) -> int:
+    """Length of the longest suffix of previous that starts following (0 below MIN_OVERLAP)."""
+    tail = previous[-MAX_OVERLAP:]
+    probe = following[:MIN_OVERLAP]
+    if len(probe) < MIN_OVERLAP:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if following.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+
+def drop_repeated_lines(emitted: str, text: str) -> str:
+    """
+    text without the lines (MIN_OVERLAP chars or longer) that appear verbatim
+    in emitted; the sentence-level split repeats them away from chunk starts.
+    """
+    lines = text.split("\n")
+    kept = [line for line in lines if len(line.strip()) < MIN_OVERLAP or line.strip() not in emitted]
+    return "\n".join(kept) if len(kept) < len(lines) else text
+
+
+@dataclass
+class PackedContext:
+    """The context text, the documents it contains (best first) and its token count (0 if not counted)."""
+
+    text: str
+    documents: List["Document"] = field(default_factory=list)
+    tokens: int = 0
+    dropped: int = 0
+
+
+@dataclass
+class _Article:
+    header: str
+    # (position within the article, chunk text, document)
+    chunks: List[Tuple[int, str, "Document"]] = field(default_factory=list)
+
+    def render(self) -> str:
+        body, previous_position = "", None
+        for position, text, _ in sorted(self.chunks, key=lambda chunk: chunk[0]):
+            if previous_position is None:
+                body = text
+            else:
+                overlap = overlap_length(body, text)
+                rest = drop_repeated_lines(body, text[overlap:])
+                if overlap:
+                    # Continues the previous chunk, possibly mid-line
+                    body += rest
+                elif position == previous_position + 1:
+                    body += "\n" + rest.lstrip()
+                else:
+                    body += GAP_MARKER + rest.lstrip()
+            previous_position = position
+        return f"{self.header}{HEADER_SEPARATOR}{body}" if self.header else body
+
+
+class ContextPacker:
+    """
+    Builds the prompt context from fused results under a token budget.
+
+    Chunks are taken best first. Chunks of the same article (madde) share one
+    header and are put back in document order, with the overlap that
+    split_madde_content repeated between neighbours removed. A chunk is
+    skipped when adding it would exceed budget tokens, but the best chunk is
+    always kept so a directly cited article is never lost.
+    """
+
+    def __init__(
+        self,
+        count_tokens: TokenCounter,
+        budget: int = 2048,
+        article_index: Optional[ArticleIndex] = None,
+    ):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.article_index = article_index
+        self._separator_tokens = count_tokens(ARTICLE_SEPARATOR)
+
+    def _position(self, key: Optional[ArticleKey], doc: "Document", rank: int) -> int:
+        chunk_ids = self.article_index.articles.get(key) if self.article_index and key else None
+        chunk_id = str(doc.metadata.get("chunk_id"))
+        if chunk_ids and chunk_id in chunk_ids:
+            return chunk_ids.index(chunk_id)
+        return rank
+
+    def pack(self, docs: Sequence["Document"]) -> PackedContext:
+        articles: Dict[object, _Article] = {}
+        article_tokens: Dict[object, int] = {}
+        packed: List["Document"] = []
+        total = 0
+
+        for rank, doc in enumerate(docs):
+            key = article_key(
+                doc.metadata.get("source_type"), doc.metadata.get("genelge_no"), doc.metadata.get("madde_no")
+            )
+            group = key if key is not None else ("chunk", rank)
+            header, text = split_header(doc.page_content)
+
+            article = articles.get(group)
+            if article is None:
+                candidate = _Article(header)
+            else:
+                candidate = _Article(article.header, list(article.chunks))
+            candidate.chunks.append((self._position(key, doc, rank), text, doc))
+            tokens = self.count_tokens(candidate.render())
+
+            if group in article_tokens:
+                added = tokens - article_tokens[group]
+            else:
+                added = tokens + (self._separator_tokens if articles else 0)
+            if packed and total + added > self.budget:
+                continue
+
+            articles[group] = candidate
+            article_tokens[group] = tokens
+            packed.append(doc)
+            total += added
+
+        text = ARTICLE_SEPARATOR.join(article.render() for article in articles.values())
+        return PackedContext(text=text, documents=packed, tokens=total, dropped=len(docs) - len(packed))
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import faiss
+
+# faiss is imported where it is used, so reading DenseIndexParams at startup
+# does not pay for loading the native library
+
+DENSE_FORMAT_VERSION = 1
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# Parameters that change the index structure; anything else is search-time
+_BUILD_KEYS = (
+    "index_type", "hnsw_m", "ef_construction", "nlist", "pq_m", "pq_bits", "quantization", "pca_dim"
+)
+QUANTIZATIONS = ("none", "sq8", "binary")
+
+
+@dataclass
+class DenseIndexParams:
+    index_type: str = "flat"
+    # HNSW
+    hnsw_m: int = 32
+    ef_construction: int = 200
+    ef_search: int = 64
+    # IVF; nlist=0 picks ~4 * sqrt(n), capped so every list gets >= 39 training points
+    nlist: int = 0
+    nprobe: int = 8
+    # IVF-PQ; pq_m must divide the embedding dim (768 = 48 * 16)
+    pq_m: int = 48
+    pq_bits: int = 8
+    # Compact storage: "sq8" keeps one int8 per dim, "binary" one bit per dim
+    # searched by Hamming distance with the shortlist rescored on float vectors
+    quantization: str = "none"
+    # Reduce vectors to this many dims with PCA before indexing, 0 keeps all
+    pca_dim: int = 0
+    # binary: number of Hamming candidates rescored = k * rescore_factor
+    rescore_factor: int = 10
+
+    def build_key(self) -> Dict:
+        return {key: getattr(self, key) for key in _BUILD_KEYS}
+
+    def describe(self) -> str:
+        """Short label such as "hnsw", "flat+sq8" or "flat+pca256+binary"."""
+        parts = [self.index_type]
+        if self.pca_dim:
+            parts.append(f"pca{self.pca_dim}")
+        if self.quantization != "none":
+            parts.append(self.quantization)
+        return "+".join(parts)
+
+
+def _auto_nlist(n: int) -> int:
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+
+def _create_base_index(dim: int, n: int, params: DenseIndexParams) -> faiss.Index:
+    import faiss
+
+    qt_8bit = faiss.ScalarQuantizer.QT_8bit
+    sq8 = params.quantization == "sq8"
+    if params.index_type == "flat":
+        return faiss.IndexScalarQuantizer(dim, qt_8bit) if sq8 else faiss.IndexFlatL2(dim)
+
+    if params.index_type == "hnsw":
+        if sq8:
+            hnsw = faiss.IndexHNSWSQ(dim, qt_8bit, params.hnsw_m)
+        else:
+            hnsw = faiss.IndexHNSWFlat(dim, params.hnsw_m)
+        hnsw.hnsw.efConstruction = params.ef_construction
+        return hnsw
+
+    nlist = params.nlist or _auto_nlist(n)
+    quantizer = faiss.IndexFlatL2(dim)
+    if params.index_type == "ivf_flat":
+        if sq8:
+            return faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, qt_8bit, faiss.METRIC_L2)
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+    if params.index_type == "ivf_pq":
+        if sq8:
+            raise ValueError("ivf_pq is already quantized, use quantization='none'")
+        if dim % params.pq_m:
+            raise ValueError(f"pq_m={params.pq_m} must divide the index dim {dim}")
+        # k-means needs at least 2^bits training points per codebook
+        bits = min(params.pq_bits, max(1, int(math.log2(max(n, 2)))))
+        return faiss.IndexIVFPQ(quantizer, dim, nlist, params.pq_m, bits)
+
+    raise ValueError(f"Unknown index type {params.index_type!r}, expected one of {INDEX_TYPES}")
+
+
+def create_faiss_index(vectors: np.ndarray, params: DenseIndexParams) -> faiss.Index:
+    """Build and train an empty float index of the requested type for vectors' dim."""
+    import faiss
+
+    n, dim = vectors.shape
+    if params.quantization not in ("none", "sq8"):
+        raise ValueError(f"Use create_binary_index for quantization={params.quantization!r}")
+
+    index = _create_base_index(params.pca_dim or dim, n, params)
+    if params.pca_dim:
+        index = faiss.IndexPreTransform(faiss.PCAMatrix(dim, params.pca_dim), index)
+    if not params.index_type.startswith("ivf"):
+        # IVF indexes store ids natively; flat and HNSW need the map
+        index = faiss.IndexIDMap2(index)
+
+    # Trains whatever needs it: PCA, the int8 ranges, IVF centroids, PQ codebooks
+    index.train(vectors)
+    return index
+
+
+def create_binary_index(
+    vectors: np.ndarray, params: DenseIndexParams
+) -> Tuple[faiss.IndexBinary, faiss.VectorTransform]:
+    """Empty Hamming index plus the trained transform (PCA or centering) applied before binarizing."""
+    import faiss
+
+    _, dim = vectors.shape
+    if params.index_type != "flat":
+        raise ValueError("Binary codes are only supported with index_type='flat'")
+    nbits = params.pca_dim or dim
+    if nbits % 8:
+        raise ValueError(f"Binary codes need a dim divisible by 8, got {nbits}")
+
+    # Sign bits only carry information once every dim is centered on zero
+    transform = faiss.PCAMatrix(dim, nbits) if params.pca_dim else faiss.CenteringTransform(dim)
+    transform.train(vectors)
+    return faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(nbits)), transform
+
+
+def _binarize(transform: faiss.VectorTransform, vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(transform.apply(vectors) > 0, axis=1)
+
+
+class DenseIndex:
+    """
+    FAISS index keyed on chunk_id.
+
+    Every vector gets a stable int64 label (its position in self.ids), so
+    chunks can be removed and added without renumbering the rest. Removed
+    labels are kept as None until the next full rebuild.
+
+    With binary quantization only the bit codes stay in RAM; the float
+    vectors used to rescore the Hamming shortlist are memory-mapped from
+    vectors.f32, so just the shortlisted rows are paged in.
+    """
+
+    def __init__(
+        self,
+        index,
+        ids: List[Optional[str]],
+        params: DenseIndexParams,
+        transform: Optional[faiss.VectorTransform] = None,
+        vectors: Optional[np.ndarray] = None,
+    ):
+        self.index = index
+        self.ids = ids
+        self.params = params
+        self.transform = transform
+        self.vectors = vectors
+        self.apply_search_params()
+
+    @classmethod
+    def build(
+        cls, vectors: np.ndarray, chunk_ids: Sequence[str], params: DenseIndexParams
+    ) -> "DenseIndex":
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if params.quantization == "binary":
+            index, transform = create_binary_index(vectors, params)
+            dense = cls(index, [], params, transform, np.zeros((0, vectors.shape[1]), np.float32))
+        else:
+            dense = cls(create_faiss_index(vectors, params), [], params)
+        dense.add(vectors, chunk_ids)
+        return dense
+
+    @property
+    def is_binary(self) -> bool:
+        return self.params.quantization == "binary"
+
+    @property
+    def dim(self) -> int:
+        return self.transform.d_in if self.is_binary else self.index.d
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    @property
+    def supports_removal(self) -> bool:
+        # HNSW graphs cannot drop nodes; those indexes are rebuilt instead
+        return self.params.index_type != "hnsw"
+
+    def resident_bytes(self) -> int:
+        """Size of the part that lives in RAM (rescoring vectors are mmapped, not counted)."""
+        import faiss
+
+        if self.is_binary:
+            return len(faiss.serialize_index_binary(self.index))
+        return len(faiss.serialize_index(self.index))
+
+    def apply_search_params(self):
+        if self.is_binary:
+            return
+        import faiss
+
+        space = faiss.ParameterSpace()
+        if self.params.index_type == "hnsw":
+            space.set_index_parameter(self.index, "efSearch", self.params.ef_search)
+        elif self.params.index_type.startswith("ivf"):
+            space.set_index_parameter(self.index, "nprobe", self.params.nprobe)
+
+    def set_search_params(
+        self,
+        ef_search: Optional[int] = None,
+        nprobe: Optional[int] = None,
+        rescore_factor: Optional[int] = None,
+    ):
+        if ef_search is not None:
+            self.params.ef_search = ef_search
+        if nprobe is not None:
+            self.params.nprobe = nprobe
+        if rescore_factor is not None:
+            self.params.rescore_factor = rescore_factor
+        self.apply_search_params()
+
+    def add(self, vectors: np.ndarray, chunk_ids: Sequence[str]):
+        if not len(chunk_ids):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        labels = np.arange(len(self.ids), len(self.ids) + len(chunk_ids), dtype=np.int64)
+        if self.is_binary:
+            self.index.add_with_ids(_binarize(self.transform, vectors), labels)
+            # Rows are addressed by label, so they are appended in the same order
+            self.vectors = np.concatenate([self.vectors, vectors])
+        else:
+            self.index.add_with_ids(vectors, labels)
+        self.ids.extend(chunk_ids)
+
+    def remove(self, chunk_ids: Sequence[str]):
+        if not self.supports_removal:
+            raise ValueError(f"{self.params.index_type} index does not support removal")
+        targets = set(chunk_ids)
+        labels = [label for label, chunk_id in enumerate(self.ids) if chunk_id in targets]
+        if labels:
+            self.index.remove_ids(np.array(labels, dtype=np.int64))
+            for label in labels:
+                self.ids[label] = None
+
+    def search(
+        self, query: np.ndarray, k: int, allowed: Optional[np.ndarray] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        k nearest chunks. allowed is an optional boolean mask over labels;
+        FAISS skips every other vector during the search itself.
+        """
+        query = np.ascontiguousarray(query, dtype=np.float32).reshape(1, -1)
+        if allowed is not None and not allowed.any():
+            return []
+        if self.is_binary:
+            if allowed is not None:
+                return self._search_subset(query, k, np.flatnonzero(allowed))
+            return self._search_binary(query, k)
+
+        if allowed is None:
+            distances, labels = self.index.search(query, k)
+        else:
+            import faiss
+
+            # The selector reads the bitmap through a raw pointer and older
+            # FAISS builds don't tie the selector to params, so both stay
+            # referenced here until the search returns
+            bitmap = np.packbits(allowed, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(allowed), faiss.swig_ptr(bitmap))
+            params = self._filtered_search_params(allowed, selector)
+            distances, labels = self.index.search(query, k, params=params)
+        return [
+            (self.ids[label], float(distance))
+            for distance, label in zip(distances[0], labels[0])
+            if label >= 0 and self.ids[label] is not None
+        ]
+
+    def _filtered_search_params(self, allowed: np.ndarray, selector):
+        import faiss
+
+        # A narrow filter leaves few allowed vectors in the neighbourhood the
+        # graph walk / probed lists cover, so widen the search by its selectivity
+        widen = len(allowed) / int(allowed.sum())
+        if self.params.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = int(min(self.index.ntotal, self.params.ef_search * widen))
+        elif self.params.index_type.startswith("ivf"):
+            params = faiss.SearchParametersIVF()
+            # params.nlist is 0 when it was picked automatically at build time
+            nlist = faiss.extract_index_ivf(self.index).nlist
+            params.nprobe = int(max(1, min(nlist, np.ceil(self.params.nprobe * widen))))
+        else:
+            params = faiss.SearchParameters()
+        params.sel = selector
+        return params
+
+    def _search_subset(self, query: np.ndarray, k: int, labels: np.ndarray) -> List[Tuple[str, float]]:
+        # Exact squared L2 on the float vectors, same scale as the flat index
+        distances = ((self.vectors[labels] - query) ** 2).sum(axis=1)
+        results = []
+        for i in np.argsort(distances):
+            chunk_id = self.ids[labels[i]]
+            if chunk_id is not None:
+                results.append((chunk_id, float(distances[i])))
+                if len(results) == k:
+                    break
+        return results
+
+    def _search_binary(self, query: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        _, labels = self.index.search(_binarize(self.transform, query), k * self.params.rescore_factor)
+        shortlist = np.sort(labels[0][labels[0] >= 0])
+        if not len(shortlist):
+            return []
+        return self._search_subset(query, k, shortlist)
+
+    def save(self, path: str):
+        import faiss
+
+        os.makedirs(path, exist_ok=True)
+        vectors_path = os.path.join(path, "vectors.f32")
+        transform_path = os.path.join(path, "transform.faiss")
+
+        # Written next to the target and renamed, so processes that have the
+        # old file mmapped keep reading a consistent copy
+        index_path = os.path.join(path, "index.faiss")
+        tmp_index = f"{index_path}.tmp"
+        if self.is_binary:
+            faiss.write_index_binary(self.index, tmp_index)
+            faiss.write_VectorTransform(self.transform, transform_path)
+            tmp_vectors = f"{vectors_path}.tmp"
+            np.ascontiguousarray(self.vectors, dtype=np.float32).tofile(tmp_vectors)
+            os.replace(tmp_vectors, vectors_path)
+            self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=self.vectors.shape)
+        else:
+            faiss.write_index(self.index, tmp_index)
+            for stale in (vectors_path, transform_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+
+        os.replace(tmp_index, index_path)
+
+        tmp_path = os.path.join(path, "index_params.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": DENSE_FORMAT_VERSION,
+                    "params": asdict(self.params),
+                    "dim": self.dim,
+                    "ntotal": self.ntotal,
+                    "ids": self.ids,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, os.path.join(path, "index_params.json"))
+
+    @classmethod
+    def load(
+        cls, path: str, search_params: Optional[DenseIndexParams] = None, mmap: bool = False
+    ) -> "DenseIndex":
+        """
+        Load a saved index. Search-time knobs (ef_search, nprobe, rescore_factor)
+        are taken from search_params when given, so they can change without a rebuild.
+
+        With mmap=True the vector storage is mapped read-only instead of copied,
+        so processes serving the same index share its pages; such an index
+        can be searched but not modified.
+        """
+        import faiss
+
+        with open(os.path.join(path, "index_params.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != DENSE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported dense index version in {path}")
+
+        params = DenseIndexParams(**meta["params"])
+        if search_params is not None:
+            params.ef_search = search_params.ef_search
+            params.nprobe = search_params.nprobe
+            params.rescore_factor = search_params.rescore_factor
+
+        # Older FAISS builds cannot map flat storage; they fall back to a private copy
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        io_flags = mmap_flag | faiss.IO_FLAG_READ_ONLY if mmap and mmap_flag else 0
+        if params.quantization == "binary":
+            index = faiss.read_index_binary(os.path.join(path, "index.faiss"), io_flags)
+            transform = faiss.read_VectorTransform(os.path.join(path, "transform.faiss"))
+            vectors = np.memmap(
+                os.path.join(path, "vectors.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(len(meta["ids"]), meta["dim"]),
+            )
+            return cls(index, meta["ids"], params, transform, vectors)
+
+        index = faiss.read_index(os.path.join(path, "index.faiss"), io_flags)
+        return cls(index, meta["ids"], params)
+
+
+def is_dense_index(path: str) -> bool:
+    # Directories written by LangChain's FAISS.save_local have no params file
+    return os.path.exists(os.path.join(path, "index_params.json"))
+
+
+if __name__ == "__main__":
+    # Filtered search on every index type with default build params
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((2000, 64)).astype(np.float32)
+    chunk_ids = [f"c{i}" for i in range(len(vectors))]
+    allowed = np.zeros(len(vectors), dtype=bool)
+    allowed[::50] = True
+    for index_type in INDEX_TYPES:
+        params = DenseIndexParams(index_type=index_type, pq_m=16)
+        dense = DenseIndex.build(vectors, chunk_ids, params)
+        hits = dense.search(vectors[100], 5, allowed)
+        if not hits or any(int(chunk_id[1:]) % 50 for chunk_id, _ in hits):
+            raise SystemExit(f"❌ Filtered {index_type} search returned {hits}")
+        print(f"✅ {params.describe()}: filtered search ok ({hits[0][0]} first)")
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = "embedding_cache"
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk store of embeddings for a single model.
+
+    Vectors live in a raw float32 file that is opened with np.memmap,
+    index.json maps the text hash of every row to its row number.
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        self.path = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "__", model_name))
+        self.vectors_path = os.path.join(self.path, "vectors.f32")
+        self.index_path = os.path.join(self.path, "index.json")
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._vectors: Optional[np.memmap] = None
+        self._load_index()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("⚠️  Embedding cache index unreadable (%s), starting empty", e)
+            return
+
+        if data.get("model") != self.model_name:
+            return
+        self.dim = data["dim"]
+        self.rows = {key: row for row, key in enumerate(data["keys"])}
+
+    def _save_index(self):
+        keys = [None] * len(self.rows)
+        for key, row in self.rows.items():
+            keys[row] = key
+
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "keys": keys}, f)
+        os.replace(tmp_path, self.index_path)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        if self._vectors is None:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(len(self.rows), self.dim),
+            )
+        return self._vectors
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def get(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {key: self.rows[key] for key in keys if key in self.rows}
+        if not found:
+            return {}
+        vectors = self.vectors
+        return {key: np.asarray(vectors[row]) for key, row in found.items()}
+
+    def add(self, keys: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Embedding dim {vectors.shape[1]} does not match cache dim {self.dim}"
+            )
+
+        os.makedirs(self.path, exist_ok=True)
+        # Rows past len(self.rows) are ignored on load, so a crash between the
+        # two writes below only leaves unused bytes behind.
+        with open(self.vectors_path, "r+b" if os.path.exists(self.vectors_path) else "wb") as f:
+            f.seek(len(self.rows) * self.dim * 4)
+            f.write(vectors.tobytes())
+            f.truncate()
+
+        for key in keys:
+            self.rows[key] = len(self.rows)
+        self._vectors = None
+        self._save_index()
+
+
+class LazyEmbeddings(Embeddings):
+    """Builds the wrapped embedder on first use, e.g. to load a model only on a cache miss."""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._embedder: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self) -> Embeddings:
+        if self._embedder is None:
+            with self._lock:
+                if self._embedder is None:
+                    self._embedder = self._factory()
+        return self._embedder
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embedder.embed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that only sends texts it has never seen to the model.
+    Query embeddings are passed straight through, to query_embedder when one
+    is given (e.g. an ONNX export of the same model).
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        model_name: str,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        query_embedder: Optional[Embeddings] = None,
+    ):
+        self.embedder = embedder
+        self.query_embedder = query_embedder
+        self.cache = EmbeddingCache(cache_dir, model_name)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents_array(texts).tolist()
+
+    def embed_documents_array(self, texts: List[str]) -> np.ndarray:
+        keys = [text_hash(text) for text in texts]
+        cached = self.cache.get(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += sum(1 for key in keys if key in missing)
+
+        if missing:
+            new_vectors = np.asarray(
+                self.embedder.embed_documents(list(missing.values())), dtype=np.float32
+            )
+            self.cache.add(list(missing.keys()), new_vectors)
+            cached.update(zip(missing.keys(), new_vectors))
+
+        if not texts:
+            return np.zeros((0, self.cache.dim or 0), dtype=np.float32)
+        return np.stack([cached[key] for key in keys])
+
+    def embed_query(self, text: str) -> List[float]:
+        return (self.query_embedder or self.embedder).embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several queries in one forward pass (used by QueryBatcher)."""
+        return (self.query_embedder or self.embedder).embed_documents(texts)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return (
+            f"Embedding cache: {self.hits} hit, {self.misses} miss "
+            f"({rate:.1f}% hit rate, {len(self.cache)} vectors on disk)"
+        )
@@ -0,0 +1,187 @@
+import argparse
+import json
+import math
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from langchain_core.documents import Document
+
+import llm_rag_setup as rag
+
+Searcher = Callable[[str, int], List[Document]]
+
+
+def load_gold_set(path: str = "gold_set.json") -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["items"]
+
+
+def target_key(metadata: Dict) -> tuple:
+    """(source_type, genelge_no, madde_no) as exported by export_for_rag."""
+    source_type = metadata.get("source_type", "genelge")
+    genelge_no = metadata.get("genelge_no") if source_type == "genelge" else None
+    return (
+        source_type,
+        str(genelge_no) if genelge_no is not None else None,
+        str(metadata.get("madde_no")) if metadata.get("madde_no") is not None else None,
+    )
+
+
+def _matches(doc_key: tuple, expected: tuple) -> bool:
+    # A missing madde_no in the gold set means "any madde of that genelge"
+    return all(e is None or d == e for d, e in zip(doc_key, expected))
+
+
+def score_ranking(docs: List[Document], expected: List[Dict], k: int) -> Dict[str, float]:
+    targets = [target_key(e) for e in expected]
+    found = set()
+    gains = []
+    first_hit = None
+
+    for rank, doc in enumerate(docs[:k], 1):
+        doc_key = target_key(doc.metadata)
+        hit = next(
+            (i for i, t in enumerate(targets) if i not in found and _matches(doc_key, t)),
+            None,
+        )
+        # Further chunks of an already found madde add nothing
+        gains.append(1.0 if hit is not None else 0.0)
+        if hit is not None:
+            found.add(hit)
+            if first_hit is None:
+                first_hit = rank
+
+    dcg = sum(g / math.log2(rank + 1) for rank, g in enumerate(gains, 1))
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(len(targets), k) + 1))
+    return {
+        "recall": len(found) / len(targets) if targets else 0.0,
+        "mrr": 1 / first_hit if first_hit else 0.0,
+        "ndcg": dcg / ideal if ideal else 0.0,
+    }
+
+
+def build_configs(retriever, weights: List[float]) -> Dict[str, Searcher]:
+    configs: Dict[str, Searcher] = {
+        "bm25": lambda q, k: [d for d, _ in retriever.bm25.search_with_scores(q, k)],
+        "faiss": lambda q, k: [d for d, _ in retriever.dense_search(q, k=k)[0]],
+    }
+
+    def hybrid(fusion: str, dense_weight: float) -> Searcher:
+        variant = retriever.model_copy(
+            update={"fusion": fusion, "dense_weight": dense_weight, "sparse_weight": 1 - dense_weight}
+        )
+
+        def search(q: str, k: int) -> List[Document]:
+            variant.k_dense = variant.k_sparse = k
+            return [d for d, _ in variant.retrieve(q)[0]]
+
+        return search
+
+    for dense_weight in weights:
+        configs[f"hybrid-rrf-{dense_weight:.1f}"] = hybrid("rrf", dense_weight)
+        configs[f"hybrid-weighted-{dense_weight:.1f}"] = hybrid("weighted", dense_weight)
+    return configs
+
+
+def evaluate(configs: Dict[str, Searcher], gold: List[Dict], k: int) -> List[Dict]:
+    rows = []
+    for name, search in configs.items():
+        metrics = {"recall": [], "mrr": [], "ndcg": []}
+        latencies = []
+        per_query = []
+
+        for item in gold:
+            started = time.perf_counter()
+            docs = search(item["question"], k)
+            latencies.append(time.perf_counter() - started)
+
+            scores = score_ranking(docs, item["expected"], k)
+            for metric, value in scores.items():
+                metrics[metric].append(value)
+            per_query.append({"question": item["question"], **scores})
+
+        latency_ms = np.array(latencies) * 1000
+        rows.append(
+            {
+                "config": name,
+                f"recall@{k}": float(np.mean(metrics["recall"])),
+                "mrr": float(np.mean(metrics["mrr"])),
+                f"ndcg@{k}": float(np.mean(metrics["ndcg"])),
+                "p50_ms": float(np.percentile(latency_ms, 50)),
+                "p95_ms": float(np.percentile(latency_ms, 95)),
+                "queries": per_query,
+            }
+        )
+    return rows
+
+
+def mark_pareto(rows: List[Dict], k: int):
+    """A config is on the front if no other one is both as accurate and as fast."""
+    for row in rows:
+        row["pareto"] = not any(
+            other is not row
+            and other[f"recall@{k}"] >= row[f"recall@{k}"]
+            and other["mrr"] >= row["mrr"]
+            and other["p50_ms"] <= row["p50_ms"]
+            and (
+                other[f"recall@{k}"] > row[f"recall@{k}"]
+                or other["mrr"] > row["mrr"]
+                or other["p50_ms"] < row["p50_ms"]
+            )
+            for other in rows
+        )
+
+
+def print_table(rows: List[Dict], k: int):
+    header = f"{'config':<22} {'recall@' + str(k):>9} {'MRR':>6} {'nDCG@' + str(k):>8} {'p50 ms':>8} {'p95 ms':>8}  Pareto"
+    print(header)
+    print("-" * len(header))
+    for row in sorted(rows, key=lambda r: r["p50_ms"]):
+        print(
+            f"{row['config']:<22} {row[f'recall@{k}']:>9.3f} {row['mrr']:>6.3f} "
+            f"{row[f'ndcg@{k}']:>8.3f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}  "
+            f"{'✓' if row['pareto'] else ''}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NoterLLM retrieval quality / speed evaluation")
+    parser.add_argument("--gold", default="gold_set.json")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--weights", default="0.5", help="Dense weights for the hybrid configs, e.g. 0.3,0.5,0.7")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    rag.configure_logging()
+
+    gold = load_gold_set(args.gold)
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    # Generation is not evaluated, the stand-in only avoids the remote endpoint
+    rag.ANSWER_CACHE_ENABLED = False
+    rag.init_rag(llm=FakeListChatModel(responses=[""]))
+    retriever = rag.get_retriever()
+    if retriever is None:
+        print("❌ RAG system could not be initialized")
+        sys.exit(1)
+
+    configs = build_configs(retriever, [float(w) for w in args.weights.split(",")])
+    # Warm-up so model loading doesn't land in the first config's latency
+    retriever.retrieve(gold[0]["question"])
+
+    rows = evaluate(configs, gold, args.k)
+    mark_pareto(rows, args.k)
+
+    print(f"\n📊 {len(gold)} soru, k={args.k}\n")
+    print_table(rows, args.k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "results": rows}, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Sonuçlar {args.output} dosyasına kaydedildi")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,13 @@
-import pypdf
+from pdf_extract import extract_pdf
 
 
 def extract_content():
-    reader = pypdf.PdfReader("documents/Birlestirilmis_Genelgeler.pdf")
-
-    page_count = len(reader.pages)
-    extracted = ""
-    for i in range(page_count):
-        page = reader.pages[i]
-        text = page.extract_text()
-        if text:
-            extracted += text + "\n"
-
-    with open("extracted.txt", "w") as f:
-        extracted = fix_genel_no_bs(extracted)
-        f.write(extracted)
+    stats = extract_pdf(
+        "documents/Birlestirilmis_Genelgeler.pdf",
+        "extracted.txt",
+        transform=fix_genel_no_bs,
+    )
+    stats.print_report()
 
 
 def fix_genel_no_bs(text) -> str:
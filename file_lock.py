@@ -0,0 +1,28 @@
+import os
+from contextlib import contextmanager
+from typing import Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Exclusive advisory lock on path (created if missing) held for the block,
+    so worker processes sharing the on-disk index don't build or write it
+    at the same time. A no-op where fcntl is unavailable.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
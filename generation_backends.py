@@ -0,0 +1,292 @@
+import json
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import ConfigDict, Field, PrivateAttr
+
+from generation_client import GenerationClient
+
+# "hf-endpoint": Hugging Face Inference API (network + HF_TOKEN)
+# "stand-in": any server speaking the same API, e.g. standin_llm_server.py
+# "llama-cpp": local GGUF model on CPU (llama-cpp-python)
+GENERATION_BACKENDS = ("hf-endpoint", "stand-in", "llama-cpp")
+CHAT_COMPLETIONS_PATH = "/v1/chat/completions"
+# OpenAI-compatible Hugging Face Inference Providers router
+HF_ROUTER_URL = "https://router.huggingface.co"
+_DONE = object()
+
+
+def _parse_event(line: str):
+    """JSON payload of a server-sent "data:" line, _DONE at the end, None otherwise."""
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:") :].strip()
+    if data == "[DONE]":
+        return _DONE
+    event = json.loads(data)
+    if event.get("error"):
+        raise RuntimeError(f"Generation endpoint error: {event['error']}")
+    return event
+
+
+@dataclass
+class GenerationParams:
+    temperature: float = 0.3
+    max_new_tokens: int = 1024
+    top_p: float = 0.95
+    repetition_penalty: float = 1.1
+
+
+def _usage_metadata(usage: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    """LangChain usage_metadata from an OpenAI-style "usage" object."""
+    if not usage:
+        return None
+    prompt, completion = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    return {
+        "input_tokens": prompt,
+        "output_tokens": completion,
+        "total_tokens": usage.get("total_tokens") or prompt + completion,
+    }
+
+
+def _message_dicts(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    def role(message: BaseMessage) -> str:
+        if isinstance(message, SystemMessage):
+            return "system"
+        if isinstance(message, AIMessage):
+            return "assistant"
+        return "user"
+
+    return [{"role": role(message), "content": message.content} for message in messages]
+
+
+class EndpointChat(BaseChatModel):
+    """
+    Chat model over the OpenAI-compatible POST /v1/chat/completions route
+    that TGI, Inference Endpoints, the Hugging Face router and
+    standin_llm_server.py serve, with streamed responses read as
+    server-sent events.
+
+    Requests go through a GenerationClient (connection pool, retries,
+    hedging, circuit breaker) built from client_options. Unlike
+    ChatHuggingFace it needs neither the Hub (to resolve the model id and
+    tokenizer of a custom URL) nor a token, works with HF_HUB_OFFLINE set,
+    and streams tokens as the server produces them.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    endpoint_url: str
+    model: str = "tgi"
+    temperature: float = 0.3
+    max_new_tokens: int = 1024
+    top_p: float = 0.95
+    timeout: Optional[float] = 120.0
+    token: Optional[str] = None
+    client_options: Dict[str, Any] = Field(default_factory=dict)
+
+    _client: GenerationClient = PrivateAttr()
+
+    def model_post_init(self, __context: Any) -> None:
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        self._client = GenerationClient(self.endpoint_url, headers=headers, timeout=self.timeout, **self.client_options)
+
+    @property
+    def client(self) -> GenerationClient:
+        return self._client
+
+    @property
+    def _llm_type(self) -> str:
+        return "endpoint-chat"
+
+    def _payload(self, messages: List[BaseMessage], stop: Optional[List[str]], stream: bool, **kwargs: Any):
+        payload = {
+            "model": self.model,
+            "messages": _message_dicts(messages),
+            "max_tokens": self.max_new_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "stream": stream,
+            **kwargs,
+        }
+        if stream:
+            # Token counts arrive with the last event
+            payload["stream_options"] = {"include_usage": True}
+        if stop:
+            payload["stop"] = stop
+        return payload
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        response = self._client.post_json(CHAT_COMPLETIONS_PATH, self._payload(messages, stop, False, **kwargs))
+        return self._chat_result(response)
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        response = await self._client.apost_json(CHAT_COMPLETIONS_PATH, self._payload(messages, stop, False, **kwargs))
+        return self._chat_result(response)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        payload = self._payload(messages, stop, True, **kwargs)
+        for line in self._client.stream_lines(CHAT_COMPLETIONS_PATH, payload):
+            event = _parse_event(line)
+            if event is _DONE:
+                # Read on to the end of the body so the connection returns to the pool
+                continue
+            chunk = self._chunk(event)
+            if chunk is not None:
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        payload = self._payload(messages, stop, True, **kwargs)
+        async for line in self._client.astream_lines(CHAT_COMPLETIONS_PATH, payload):
+            event = _parse_event(line)
+            if event is _DONE:
+                # Read on to the end of the body so the connection returns to the pool
+                continue
+            chunk = self._chunk(event)
+            if chunk is not None:
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+    def _chat_result(self, response: Dict[str, Any]) -> ChatResult:
+        choice = response["choices"][0]
+        generation = ChatGeneration(
+            message=AIMessage(
+                content=choice["message"].get("content") or "",
+                usage_metadata=_usage_metadata(response.get("usage")),
+            ),
+            generation_info={"finish_reason": choice.get("finish_reason")},
+        )
+        return ChatResult(
+            generations=[generation],
+            llm_output={"token_usage": response.get("usage"), "model": self.endpoint_url},
+        )
+
+    @staticmethod
+    def _chunk(event: Optional[Dict[str, Any]]) -> Optional[ChatGenerationChunk]:
+        if not event:
+            return None
+        choices = event.get("choices")
+        content = choices[0].get("delta", {}).get("content") if choices else None
+        # With include_usage the token counts come in a final event without choices
+        usage = _usage_metadata(event.get("usage"))
+        if not content and usage is None:
+            return None
+        return ChatGenerationChunk(message=AIMessageChunk(content=content or "", usage_metadata=usage))
+
+
+def create_llm(
+    backend: str,
+    repo_id: str,
+    params: Optional[GenerationParams] = None,
+    endpoint_url: Optional[str] = None,
+    model_path: Optional[str] = None,
+    token: Optional[str] = None,
+    n_ctx: int = 4096,
+    threads: int = 0,
+    managed_client: bool = False,
+    client_options: Optional[Dict[str, Any]] = None,
+) -> BaseChatModel:
+    """
+    Chat model for one of GENERATION_BACKENDS. endpoint_url is used by
+    "stand-in", model_path (a GGUF file) and n_ctx / threads by "llama-cpp";
+    threads=0 lets llama.cpp pick.
+
+    "stand-in" goes through a GenerationClient configured by client_options.
+    "hf-endpoint" uses ChatHuggingFace unless managed_client is set; the
+    managed path talks to the router's chat completions API, which has no
+    repetition_penalty, so it is opt-in until both send the same parameters.
+    """
+    params = params or GenerationParams()
+    client_options = client_options or {}
+
+    if backend == "hf-endpoint" and managed_client:
+        return EndpointChat(
+            endpoint_url=HF_ROUTER_URL,
+            model=repo_id,
+            temperature=params.temperature,
+            max_new_tokens=params.max_new_tokens,
+            top_p=params.top_p,
+            token=token,
+            client_options=client_options,
+        )
+
+    if backend == "hf-endpoint":
+        from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
+
+        llm_endpoint = HuggingFaceEndpoint(
+            repo_id=repo_id,
+            huggingfacehub_api_token=token,
+            temperature=params.temperature,
+            max_new_tokens=params.max_new_tokens,
+            top_p=params.top_p,
+            repetition_penalty=params.repetition_penalty,
+        )
+        return ChatHuggingFace(llm=llm_endpoint)
+
+    if backend == "stand-in":
+        if not endpoint_url:
+            raise ValueError('The "stand-in" backend needs an endpoint_url')
+        return EndpointChat(
+            endpoint_url=endpoint_url,
+            temperature=params.temperature,
+            max_new_tokens=params.max_new_tokens,
+            top_p=params.top_p,
+            token=token,
+            client_options=client_options,
+        )
+
+    if backend == "llama-cpp":
+        if not model_path:
+            raise ValueError('The "llama-cpp" backend needs model_path (a GGUF file)')
+        try:
+            from langchain_community.chat_models import ChatLlamaCpp
+        except ImportError as e:
+            raise ImportError(
+                'The "llama-cpp" backend needs langchain-community and llama-cpp-python '
+                "(pip install llama-cpp-python)"
+            ) from e
+
+        options = {"n_threads": threads} if threads else {}
+        return ChatLlamaCpp(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            temperature=params.temperature,
+            max_tokens=params.max_new_tokens,
+            top_p=params.top_p,
+            repeat_penalty=params.repetition_penalty,
+            verbose=False,
+            **options,
+        )
+
+    raise ValueError(f"Unknown generation backend: {backend} (expected one of {', '.join(GENERATION_BACKENDS)})")
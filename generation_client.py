@@ -0,0 +1,464 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without contacting the endpoint while the circuit breaker is open."""
+
+
+class RetryableStatusError(httpx.HTTPStatusError):
+    """A response whose status is worth retrying (5xx, 429, ...)."""
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: before retry n (1-based) wait a
+    random time up to min(max_delay, base_delay * 2 ** (n - 1)), or what
+    the server asked for in Retry-After when that is longer.
+    """
+
+    max_attempts: int = 3
+    base_delay: float = 0.25
+    max_delay: float = 4.0
+
+    def backoff(self, retry: int, retry_after: Optional[float] = None) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Closed until failure_threshold consecutive failures, then open (calls
+    fail fast with CircuitOpenError) for reset_timeout seconds, then half
+    open: one probe request decides between closed and open again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"Generation endpoint circuit is open (retrying after {self.reset_timeout:.0f} s)")
+
+    def release(self):
+        """Give up a half-open probe that ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, success: bool):
+        with self._lock:
+            self._probing = False
+            if success:
+                self._failures = 0
+                self._opened_at = None
+                return
+            self._failures += 1
+            # A failed half-open probe re-opens the circuit for another reset_timeout
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.opens += 1
+                self._opened_at = time.monotonic()
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class GenerationClient:
+    """
+    Managed HTTP client for the generation endpoint.
+
+    One persistent connection pool per client (HTTP/2 when the h2 package is
+    installed, keep-alive HTTP/1.1 otherwise). Transport errors and
+    RETRYABLE_STATUSES are retried with jittered exponential backoff; other
+    errors are raised at once. Consecutive failures open the circuit breaker.
+
+    With hedge=True a non-streaming request that has not answered after the
+    hedge_quantile (p95) of recent latencies gets a second copy and the
+    first reply wins. Streams are retried until their first line arrives,
+    but not hedged: a duplicate stream would generate the answer twice.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 120.0,
+        max_connections: int = 16,
+        max_keepalive_connections: int = 8,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        retry: Optional[RetryPolicy] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_samples: int = 20,
+    ):
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+
+        self.http2 = http2 and _http2_available()
+        if http2 and not self.http2:
+            logger.warning("⚠️  h2 not installed, generation client falls back to HTTP/1.1 keep-alive")
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        options = dict(base_url=base_url.rstrip("/"), headers=headers or {}, timeout=timeout, limits=limits)
+        self._client = httpx.Client(http2=self.http2, **options)
+        self._async_client = httpx.AsyncClient(http2=self.http2, **options)
+        self._hedge_executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="hedge")
+
+        self._lock = threading.Lock()
+        self._latencies: deque = deque(maxlen=500)
+        self._counters: Dict[str, int] = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "connections_opened": 0,
+        }
+        self._retry_reasons: Dict[str, int] = {}
+        self._http_versions: Dict[str, int] = {}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _trace(self, event: str, info: Dict[str, Any]):
+        if event == "connection.connect_tcp.complete":
+            self._count("connections_opened")
+
+    async def _atrace(self, event: str, info: Dict[str, Any]):
+        self._trace(event, info)
+
+    def _record_response(self, response: httpx.Response, started: Optional[float] = None):
+        """started is given for complete (non-streamed) responses, whose latency drives hedging."""
+        with self._lock:
+            self._http_versions[response.http_version] = self._http_versions.get(response.http_version, 0) + 1
+            if started is not None:
+                self._latencies.append(time.perf_counter() - started)
+
+    def _record_retry(self, reason: str):
+        with self._lock:
+            self._counters["retries"] += 1
+            self._retry_reasons[reason] = self._retry_reasons.get(reason, 0) + 1
+
+    def _latency_quantile(self, quantile: float) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or len(self._latencies) < self.hedge_min_samples:
+            return None
+        return self._latency_quantile(self.hedge_quantile)
+
+    def stats(self) -> Dict[str, Any]:
+        """Request, retry, hedge, circuit breaker and connection pool counters."""
+        p50, p95 = self._latency_quantile(0.5), self._latency_quantile(0.95)
+        with self._lock:
+            counters = dict(self._counters)
+            stats = {
+                **counters,
+                "retry_reasons": dict(self._retry_reasons),
+                "http_versions": dict(self._http_versions),
+                # Attempts that went over an already open connection
+                "connections_reused": max(counters["attempts"] - counters["connections_opened"], 0),
+            }
+        stats["latency_p50_ms"] = p50 * 1000 if p50 is not None else None
+        stats["latency_p95_ms"] = p95 * 1000 if p95 is not None else None
+        stats["breaker"] = {
+            "state": self.breaker.state,
+            "opens": self.breaker.opens,
+            "rejected": self.breaker.rejected,
+        }
+        return stats
+
+    @staticmethod
+    def _check(response: httpx.Response) -> httpx.Response:
+        if response.status_code in RETRYABLE_STATUSES:
+            raise RetryableStatusError(
+                f"{response.status_code} from generation endpoint", request=response.request, response=response
+            )
+        response.raise_for_status()
+        return response
+
+    def _retry_delay(self, error: Exception, retry: int) -> Optional[float]:
+        """Seconds to wait before retry number `retry`, None if error is not retryable."""
+        if isinstance(error, RetryableStatusError):
+            reason, retry_after = str(error.response.status_code), _retry_after(error.response)
+        elif isinstance(error, httpx.TransportError):
+            reason, retry_after = type(error).__name__, None
+        else:
+            return None
+        if retry >= self.retry.max_attempts:
+            return None
+        self._record_retry(reason)
+        return self.retry.backoff(retry, retry_after)
+
+    def _call(self, attempt: Callable[[], Any]) -> Any:
+        self._count("requests")
+        retry = 0
+        while True:
+            self.breaker.allow()
+            try:
+                result = attempt()
+            except Exception as e:
+                failed = isinstance(e, (RetryableStatusError, httpx.TransportError))
+                self.breaker.record(not failed)
+                retry += 1
+                delay = self._retry_delay(e, retry)
+                if delay is None:
+                    self._count("failures")
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (client gone, hedge lost) or interrupted: no verdict on
+                # the endpoint, but a half-open probe must not stay claimed
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            return result
+
+    async def _acall(self, attempt: Callable[[], Any]) -> Any:
+        self._count("requests")
+        retry = 0
+        while True:
+            self.breaker.allow()
+            try:
+                result = await attempt()
+            except Exception as e:
+                failed = isinstance(e, (RetryableStatusError, httpx.TransportError))
+                self.breaker.record(not failed)
+                retry += 1
+                delay = self._retry_delay(e, retry)
+                if delay is None:
+                    self._count("failures")
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (client gone, hedge lost) or interrupted: no verdict on
+                # the endpoint, but a half-open probe must not stay claimed
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            return result
+
+    def _post_once(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self._count("attempts")
+        started = time.perf_counter()
+        response = self._client.post(path, json=payload, extensions={"trace": self._trace})
+        self._check(response)
+        self._record_response(response, started)
+        return response.json()
+
+    async def _apost_once(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        self._count("attempts")
+        started = time.perf_counter()
+        response = await self._async_client.post(path, json=payload, extensions={"trace": self._atrace})
+        self._check(response)
+        self._record_response(response, started)
+        return response.json()
+
+    def _hedged(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        delay = self._hedge_delay()
+        if delay is None:
+            return self._post_once(path, payload)
+
+        primary = self._hedge_executor.submit(self._post_once, path, payload)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedge = self._hedge_executor.submit(self._post_once, path, payload)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedge_wins")
+                    # The slower copy finishes in the background and is discarded
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _ahedged(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._apost_once(path, payload)
+
+        primary = asyncio.ensure_future(self._apost_once(path, payload))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedge = asyncio.ensure_future(self._apost_once(path, payload))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def post_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._call(lambda: self._hedged(path, payload))
+
+    async def apost_json(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._acall(lambda: self._ahedged(path, payload))
+
+    @contextmanager
+    def _open_stream(self, path: str, payload: Dict[str, Any]) -> Iterator[Iterator[str]]:
+        def attempt():
+            self._count("attempts")
+            context = self._client.stream("POST", path, json=payload, extensions={"trace": self._trace})
+            response = context.__enter__()
+            try:
+                self._check(response)
+            except Exception:
+                context.__exit__(None, None, None)
+                raise
+            self._record_response(response)
+            return context, response
+
+        context, response = self._call(attempt)
+        try:
+            yield response.iter_lines()
+        finally:
+            context.__exit__(None, None, None)
+
+    def stream_lines(self, path: str, payload: Dict[str, Any]) -> Iterator[str]:
+        """Lines of a streamed response; retried until the response headers arrive."""
+        with self._open_stream(path, payload) as lines:
+            yield from lines
+
+    async def astream_lines(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        async def attempt():
+            self._count("attempts")
+            context = self._async_client.stream("POST", path, json=payload, extensions={"trace": self._atrace})
+            response = await context.__aenter__()
+            try:
+                self._check(response)
+            except Exception:
+                await context.__aexit__(None, None, None)
+                raise
+            self._record_response(response)
+            return context, response
+
+        context, response = await self._acall(attempt)
+        try:
+            async for line in response.aiter_lines():
+                yield line
+        finally:
+            await context.__aexit__(None, None, None)
+
+    def close(self):
+        self._client.close()
+        self._hedge_executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    # A cancelled half-open probe must leave the breaker able to probe again
+    async def cancelled_probe():
+        client = GenerationClient("http://127.0.0.1:9", breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+        client.breaker.record(False)
+
+        async def hang():
+            await asyncio.sleep(60)
+
+        probe = asyncio.ensure_future(client._acall(hang))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        try:
+            await probe
+        except asyncio.CancelledError:
+            pass
+
+        async def succeed():
+            return "ok"
+
+        result = await client._acall(succeed)
+        state = client.breaker.state
+        client.close()
+        if result != "ok" or state != "closed":
+            raise SystemExit(f"❌ Breaker stuck after a cancelled probe: {state}")
+        print("✅ Cancelled half-open probe released, next probe closed the circuit")
+
+    asyncio.run(cancelled_probe())
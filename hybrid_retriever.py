@@ -0,0 +1,293 @@
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, InstanceOf, PrivateAttr
+
+from article_lookup import ArticleIndex, parse_references
+from bm25_index import BM25IndexRetriever
+from dense_index import DenseIndex
+from metadata_filter import FilterIndex, Filters, active_filters
+from reranker import Reranker
+
+ScoredDocs = List[Tuple[Document, float]]
+
+
+@dataclass
+class RetrievalTimings:
+    lookup: float = 0.0
+    embed: float = 0.0
+    faiss: float = 0.0
+    bm25: float = 0.0
+    fusion: float = 0.0
+    rerank: float = 0.0
+    total: float = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return asdict(self)
+
+
+class LatencyStats:
+    """Rolling window of per-stage latencies, safe to update from many threads."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self.window = window
+
+    def record(self, timings: Dict[str, float]):
+        with self._lock:
+            for stage, seconds in timings.items():
+                self._samples.setdefault(stage, deque(maxlen=self.window)).append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self._samples.items()}
+        return {
+            stage: {
+                "count": len(values),
+                "p50_ms": float(np.percentile(values, 50) * 1000),
+                "p95_ms": float(np.percentile(values, 95) * 1000),
+            }
+            for stage, values in samples.items()
+            if values
+        }
+
+
+def chunk_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def _min_max(scores: List[float]) -> List[float]:
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(scores)
+    return [(s - low) / (high - low) for s in scores]
+
+
+def fuse_results(
+    legs: List[ScoredDocs],
+    weights: List[float],
+    method: str = "rrf",
+    rrf_c: int = 60,
+) -> ScoredDocs:
+    """
+    Merge ranked lists into one, deduplicated by chunk_id.
+
+    "rrf" is reciprocal rank fusion (same formula as EnsembleRetriever),
+    "weighted" min-max normalizes each leg's scores and sums them by weight.
+    Leg scores must be "higher is better".
+    """
+    fused: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+
+    for leg, weight in zip(legs, weights):
+        if method == "rrf":
+            leg_scores = [weight / (rank + rrf_c) for rank in range(1, len(leg) + 1)]
+        elif method == "weighted":
+            leg_scores = [weight * s for s in _min_max([score for _, score in leg])]
+        else:
+            raise ValueError(f"Unknown fusion method: {method}")
+
+        for (doc, _), score in zip(leg, leg_scores):
+            key = chunk_key(doc)
+            docs.setdefault(key, doc)
+            fused[key] = fused.get(key, 0.0) + score
+
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return [(docs[key], score) for key, score in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Dense (FAISS) + sparse (BM25) retriever whose legs run concurrently.
+
+    The BM25 leg is submitted to a shared thread pool while the calling thread
+    embeds the query and searches FAISS; both spend their time in native code
+    that releases the GIL, so retrieval latency is roughly max(dense, sparse).
+
+    With a filter_index (and a ChunkStore docstore), retrieve() takes metadata
+    filters; both legs only consider matching chunks while searching, so the
+    k slots are never taken by chunks a post-filter would drop.
+
+    With an article_index, articles the question names ("Kanun Madde 60",
+    "Genelge 112 madde 3") are fetched by key and put first. When the source
+    of every reference is stated and all of them exist, the dense leg is
+    skipped and BM25 only fills the remaining slots; a genelge named without
+    an article scopes both legs to it.
+
+    With a reranker, the first rerank_candidates fused chunks are rescored
+    by a cross-encoder and only its top_n are kept (referenced articles stay
+    first and count toward top_n).
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    dense: DenseIndex
+    docstore: InstanceOf[Mapping]
+    embeddings: Embeddings
+    bm25: BM25IndexRetriever
+    k_dense: int = 5
+    k_sparse: int = 5
+    k: Optional[int] = None
+    fusion: str = "rrf"
+    dense_weight: float = 0.5
+    sparse_weight: float = 0.5
+    rrf_c: int = 60
+    max_workers: int = 4
+    filter_index: Optional[FilterIndex] = None
+    article_index: Optional[ArticleIndex] = None
+    reranker: Optional[Reranker] = None
+    rerank_candidates: int = 20
+
+    _executor: ThreadPoolExecutor = PrivateAttr()
+    _stats: LatencyStats = PrivateAttr(default_factory=LatencyStats)
+    # Chunk store row of every dense label / BM25 column, to translate filter masks
+    _dense_rows: Optional[np.ndarray] = PrivateAttr(default=None)
+    _bm25_rows: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def model_post_init(self, __context: Any):
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="bm25-leg"
+        )
+        if self.filter_index is not None:
+            self._dense_rows = self.docstore.rows(self.dense.ids)
+            self._bm25_rows = self.docstore.rows(self.bm25.index.doc_ids.tolist())
+
+    def allowed(self, filters: Optional[Filters]) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+        """Boolean masks over dense labels and BM25 columns, (None, None) without filters."""
+        if not active_filters(filters):
+            return None, None
+        if self.filter_index is None:
+            raise ValueError("Filtered retrieval needs a filter_index")
+        return (
+            self.filter_index.select(filters, self._dense_rows),
+            self.filter_index.select(filters, self._bm25_rows),
+        )
+
+    def lookup_articles(
+        self, query: str, filters: Optional[Filters] = None
+    ) -> Tuple[ScoredDocs, bool, Optional[Filters]]:
+        """
+        (directly referenced chunks, whether the dense leg can be skipped,
+        filters extended by the genelge scope of the question).
+        """
+        if self.article_index is None:
+            return [], False, filters
+
+        parsed = parse_references(query)
+        chunk_ids, found_all = self.article_index.lookup(parsed)
+
+        active = active_filters(filters)
+        if chunk_ids and active and self.filter_index is not None:
+            mask = self.filter_index.mask(active)
+            rows = self.docstore.rows(chunk_ids)
+            chunk_ids = [chunk_id for chunk_id, row in zip(chunk_ids, rows) if row >= 0 and mask[row]]
+
+        scope = self.article_index.known_genelgeler(parsed.genelge_scope)
+        if scope and self.filter_index is not None and "genelge_no" not in active:
+            filters = {**active, "genelge_no": scope}
+
+        direct = [(self.docstore[chunk_id], 0.0) for chunk_id in chunk_ids]
+        return direct, parsed.unambiguous and found_all and bool(direct), filters
+
+    def _sparse_leg(self, query: str, allowed: Optional[np.ndarray] = None) -> Tuple[ScoredDocs, float]:
+        started = time.perf_counter()
+        results = self.bm25.search_with_scores(query, self.k_sparse, allowed)
+        return results, time.perf_counter() - started
+
+    def dense_search(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]] = None,
+        k: Optional[int] = None,
+        allowed: Optional[np.ndarray] = None,
+    ) -> Tuple[ScoredDocs, float, float]:
+        started = time.perf_counter()
+        if query_embedding is None:
+            query_embedding = self.embeddings.embed_query(query)
+        embedded = time.perf_counter()
+
+        hits = self.dense.search(
+            np.asarray(query_embedding, dtype=np.float32), k or self.k_dense, allowed
+        )
+        # FAISS returns L2 distances, fusion expects "higher is better"
+        results = [(self.docstore[chunk_id], -distance) for chunk_id, distance in hits]
+        return results, embedded - started, time.perf_counter() - embedded
+
+    def retrieve(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[Filters] = None,
+    ) -> Tuple[ScoredDocs, RetrievalTimings]:
+        started = time.perf_counter()
+        direct, skip_dense, filters = self.lookup_articles(query, filters)
+        lookup_time = time.perf_counter() - started
+
+        dense_allowed, sparse_allowed = self.allowed(filters)
+        sparse_future = self._executor.submit(self._sparse_leg, query, sparse_allowed)
+
+        if skip_dense:
+            dense, embed_time, faiss_time = [], 0.0, 0.0
+        else:
+            dense, embed_time, faiss_time = self.dense_search(
+                query, query_embedding, allowed=dense_allowed
+            )
+        sparse, bm25_time = sparse_future.result()
+
+        fusion_started = time.perf_counter()
+        fused = fuse_results(
+            [sparse, dense],
+            [self.sparse_weight, self.dense_weight],
+            method=self.fusion,
+            rrf_c=self.rrf_c,
+        )
+        if direct:
+            # Referenced articles go first, above every fused score
+            top = max((score for _, score in fused), default=0.0) + 1.0
+            direct_keys = {chunk_key(doc) for doc, _ in direct}
+            fused = [(doc, top) for doc, _ in direct] + [
+                (doc, score) for doc, score in fused if chunk_key(doc) not in direct_keys
+            ]
+        fusion_finished = time.perf_counter()
+
+        if self.reranker is not None:
+            rest = fused[len(direct) :][: self.rerank_candidates]
+            fused = fused[: len(direct)] + self.reranker.rerank(
+                query, rest, top_n=self.reranker.top_n - len(direct)
+            )
+        if self.k is not None:
+            fused = fused[: self.k]
+        finished = time.perf_counter()
+
+        timings = RetrievalTimings(
+            lookup=lookup_time,
+            embed=embed_time,
+            faiss=faiss_time,
+            bm25=bm25_time,
+            fusion=fusion_finished - fusion_started,
+            rerank=finished - fusion_finished,
+            total=finished - started,
+        )
+        self._stats.record(timings.as_dict())
+        return fused, timings
+
+    def latency_summary(self) -> Dict[str, Dict[str, float]]:
+        return self._stats.summary()
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [doc for doc, _ in self.retrieve(query)[0]]
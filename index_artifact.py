@@ -0,0 +1,220 @@
+import json
+import os
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from bm25_index import BM25Index, _mmap_npz
+from dense_index import DenseIndex, DenseIndexParams
+from index_manifest import save_manifest
+from metadata_filter import FilterIndex
+
+ARTIFACT_VERSION = 2
+HEADER_FILE = "artifact.json"
+DATA_FILE = "data.npz"
+MANIFEST_FILE = "manifest.json"
+
+
+def _pack_strings(name: str, strings: Sequence[str]) -> Dict[str, np.ndarray]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return {f"{name}.blob": blob, f"{name}.offsets": offsets}
+
+
+def _unpack_string(blob: np.ndarray, offsets: np.ndarray, row: int) -> str:
+    return blob[offsets[row] : offsets[row + 1]].tobytes().decode("utf-8")
+
+
+class ChunkStore(Mapping):
+    """
+    Read-only chunk_id -> Document mapping over flat arrays.
+
+    All chunk texts live in one UTF-8 blob addressed by offsets, and every
+    metadata key is its own column of JSON-encoded values (an empty span
+    means the chunk has no such key). Opened from a memory-mapped file, the
+    arrays are shared by every process serving the index; Documents are only
+    materialized on lookup.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._arrays = arrays
+        self.chunk_ids = arrays["chunk_ids"]
+        self._sorted_ids = arrays["sorted_ids"]
+        self._sorted_rows = arrays["sorted_rows"]
+        self.columns = [
+            name[len("meta.") : -len(".offsets")]
+            for name in arrays
+            if name.startswith("meta.") and name.endswith(".offsets")
+        ]
+
+    @staticmethod
+    def to_arrays(documents: Sequence[Document]) -> Dict[str, np.ndarray]:
+        chunk_ids = np.array([doc.metadata["chunk_id"] for doc in documents])
+        order = np.argsort(chunk_ids, kind="stable")
+        arrays = {
+            "chunk_ids": chunk_ids,
+            "sorted_ids": chunk_ids[order],
+            "sorted_rows": order.astype(np.int64),
+        }
+        arrays.update(_pack_strings("text", [doc.page_content for doc in documents]))
+
+        keys = sorted({key for doc in documents for key in doc.metadata if key != "chunk_id"})
+        for key in keys:
+            values = [
+                json.dumps(doc.metadata[key], ensure_ascii=False) if key in doc.metadata else ""
+                for doc in documents
+            ]
+            arrays.update(_pack_strings(f"meta.{key}", values))
+        return arrays
+
+    def row(self, chunk_id: str) -> int:
+        pos = int(np.searchsorted(self._sorted_ids, chunk_id))
+        if pos == len(self._sorted_ids) or self._sorted_ids[pos] != chunk_id:
+            raise KeyError(chunk_id)
+        return int(self._sorted_rows[pos])
+
+    def rows(self, chunk_ids: Sequence[Optional[str]]) -> np.ndarray:
+        """Row of every chunk_id at once, -1 for ids that are not in the store (or None)."""
+        ids = np.array([chunk_id or "" for chunk_id in chunk_ids], dtype=self._sorted_ids.dtype)
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self._sorted_ids, ids), len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == ids, self._sorted_rows[pos], -1)
+
+    def text(self, row: int) -> str:
+        return _unpack_string(self._arrays["text.blob"], self._arrays["text.offsets"], row)
+
+    def value(self, key: str, row: int) -> Any:
+        raw = _unpack_string(self._arrays[f"meta.{key}.blob"], self._arrays[f"meta.{key}.offsets"], row)
+        return json.loads(raw) if raw else None
+
+    def column(self, key: str) -> List[Any]:
+        """Every chunk's value for one metadata key, in row order (None when absent)."""
+        if key not in self.columns:
+            return [None] * len(self)
+        return [self.value(key, row) for row in range(len(self))]
+
+    def document(self, row: int) -> Document:
+        metadata = {}
+        for key in self.columns:
+            offsets = self._arrays[f"meta.{key}.offsets"]
+            if offsets[row + 1] > offsets[row]:
+                metadata[key] = self.value(key, row)
+        metadata["chunk_id"] = str(self.chunk_ids[row])
+        return Document(page_content=self.text(row), metadata=metadata)
+
+    def __getitem__(self, chunk_id: str) -> Document:
+        return self.document(self.row(chunk_id))
+
+    def __iter__(self) -> Iterator[str]:
+        return (str(chunk_id) for chunk_id in self.chunk_ids)
+
+    def __len__(self) -> int:
+        return len(self.chunk_ids)
+
+
+def source_fingerprint(paths: Sequence[str]) -> Dict[str, Optional[List[int]]]:
+    """(size, mtime_ns) per source file; cheap enough to check on every start."""
+    fingerprint = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint[path] = [stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            fingerprint[path] = None
+    return fingerprint
+
+
+def read_header(path: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(path, HEADER_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if header.get("version") != ARTIFACT_VERSION:
+        return None
+    return header
+
+
+def write_artifact(
+    path: str,
+    documents: Sequence[Document],
+    bm25: BM25Index,
+    dense: DenseIndex,
+    header: Dict,
+    manifest: Optional[Dict[str, str]] = None,
+):
+    """
+    Write the dense index, the chunk store and the BM25 arrays, the manifest,
+    then the header. Every file is renamed into place, and the header goes
+    last so a crash mid-write leaves an artifact that fails the freshness check.
+    """
+    os.makedirs(path, exist_ok=True)
+    dense.save(path)
+
+    arrays = {f"chunks.{name}": array for name, array in ChunkStore.to_arrays(documents).items()}
+    arrays.update({f"bm25.{name}": array for name, array in bm25.to_arrays().items()})
+    arrays.update({f"filters.{name}": array for name, array in FilterIndex.to_arrays(documents).items()})
+    tmp_data = os.path.join(path, "data.tmp.npz")
+    np.savez(tmp_data, **arrays)
+    os.replace(tmp_data, os.path.join(path, DATA_FILE))
+    if manifest is not None:
+        save_manifest(os.path.join(path, MANIFEST_FILE), manifest)
+
+    header = {
+        "version": ARTIFACT_VERSION,
+        "created_at": time.time(),
+        "chunk_count": len(documents),
+        **header,
+    }
+    tmp_header = os.path.join(path, f"{HEADER_FILE}.tmp")
+    with open(tmp_header, "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_header, os.path.join(path, HEADER_FILE))
+
+
+def _with_prefix(arrays: Dict[str, np.ndarray], prefix: str) -> Dict[str, np.ndarray]:
+    return {name[len(prefix) :]: array for name, array in arrays.items() if name.startswith(prefix)}
+
+
+@dataclass
+class IndexArtifact:
+    """
+    Everything retrieval needs, opened from one versioned directory:
+
+        artifact.json   version, source fingerprint, build settings
+        manifest.json   chunk_id -> content hash (incremental updates)
+        index.faiss     dense index, index_params.json holds its params
+        data.npz        chunk texts, metadata columns, BM25 CSR arrays and
+                        per-field value codes for filtered retrieval
+
+    Nothing is unpickled; the .npz members and the FAISS vector storage are
+    memory-mapped read-only.
+    """
+
+    header: Dict
+    chunks: ChunkStore
+    bm25: BM25Index
+    dense: DenseIndex
+    filters: FilterIndex
+
+    @classmethod
+    def open(cls, path: str, search_params: Optional[DenseIndexParams] = None) -> "IndexArtifact":
+        header = read_header(path)
+        if header is None:
+            raise ValueError(f"No index artifact (version {ARTIFACT_VERSION}) at {path}")
+
+        arrays = _mmap_npz(os.path.join(path, DATA_FILE))
+        return cls(
+            header=header,
+            chunks=ChunkStore(_with_prefix(arrays, "chunks.")),
+            bm25=BM25Index.from_arrays(_with_prefix(arrays, "bm25.")),
+            dense=DenseIndex.load(path, search_params, mmap=True),
+            filters=FilterIndex(_with_prefix(arrays, "filters.")),
+        )
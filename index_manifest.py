@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestDiff:
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return (
+            f"+{len(self.added)} added, ~{len(self.changed)} changed, "
+            f"-{len(self.removed)} removed"
+        )
+
+
+def content_hash(content: str, metadata: Dict) -> str:
+    """
+    Hash of everything that ends up in the index for a chunk.
+    Metadata is included so that a re-titled madde also refreshes the docstore.
+    """
+    payload = json.dumps(
+        {"content": content, "metadata": metadata},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def unique_chunk_id(chunk_id: Optional[str], content: str, seen: Dict[str, int]) -> str:
+    """
+    Return a chunk id that is unique within one build.
+    process.py / process_kanun.py ids are md5 prefixes of the first 50 characters,
+    so repeated madde numbers can collide; those get a stable "-2", "-3" suffix.
+    Items without an id fall back to a hash of their content.
+    """
+    base = chunk_id or hashlib.md5(content.encode("utf-8")).hexdigest()[:12]
+    seen[base] = seen.get(base, 0) + 1
+    if seen[base] == 1:
+        return base
+    return f"{base}-{seen[base]}"
+
+
+def load_manifest(path: str) -> Optional[Dict[str, str]]:
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning("⚠️  Index manifest could not be read (%s), ignoring it", e)
+        return None
+
+    if data.get("version") != MANIFEST_VERSION:
+        return None
+    return data.get("chunks", {})
+
+
+def save_manifest(path: str, chunks: Dict[str, str]):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": MANIFEST_VERSION, "chunks": chunks},
+            f,
+            ensure_ascii=False,
+            indent=0,
+        )
+    os.replace(tmp_path, path)
+
+
+def manifest_fingerprint(path: str) -> str:
+    """Hash of the saved manifest, changes whenever the indexed chunks change."""
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def diff_manifest(old: Dict[str, str], new: Dict[str, str]) -> ManifestDiff:
+    diff = ManifestDiff()
+    for chunk_id, digest in new.items():
+        if chunk_id not in old:
+            diff.added.append(chunk_id)
+        elif old[chunk_id] != digest:
+            diff.changed.append(chunk_id)
+    diff.removed = [chunk_id for chunk_id in old if chunk_id not in new]
+    return diff
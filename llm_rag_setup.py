@@ -1,141 +1,335 @@
-from langchain.schema import Document
+from __future__ import annotations
+
+import asyncio
 import json
+import logging
 import os
-import pickle
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.retrievers import BM25Retriever
-from langchain.retrievers import EnsembleRetriever
-from langchain_huggingface import ChatHuggingFace, HuggingFaceEndpoint
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from typing import Optional
-
-_qa_chain: Optional[RetrievalQA] = None
-_initialized = False
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
+from context_packer import ContextPacker, PackedContext
+from dense_index import DenseIndexParams
+from file_lock import file_lock
+from metadata_filter import Filters, active_filters
+from metrics import ANSWER_CACHE_LOOKUPS, ERRORS, QUERIES, REGISTRY, TOKENS, observe_stages, span
+from request_limiter import ConcurrencyLimiter, QueueFullError, QueueTimeoutError
+from startup_timing import PhaseTimer
+from turkish_analyzer import TurkishAnalyzer
+from index_manifest import (
+    ManifestDiff,
+    content_hash,
+    diff_manifest,
+    load_manifest,
+    manifest_fingerprint,
+    unique_chunk_id,
+)
 
-def init_rag():
-    global _qa_chain, _initialized
+# langchain, torch (via sentence-transformers), faiss and scipy are imported
+# inside init_rag, so importing this module stays cheap and a UI can bind its
+# port before the models and indexes are loaded
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.prompts import PromptTemplate
 
-    if _initialized:
-        return
+    from answer_cache import AnswerCache
+    from dense_index import DenseIndex
+    from embedding_cache import CachedEmbeddings
+    from query_batcher import QueryBatcher
+    from hybrid_retriever import HybridRetriever
 
-    HF_TOKEN = os.getenv("HF_TOKEN")
-    if not HF_TOKEN:
-        print(
-            "⚠️  HF_TOKEN not found in environment variables. Set it in Spaces secrets or .env file"
-        )
+logger = logging.getLogger(__name__)
 
-    documents = []
+EMBEDDING_MODEL_NAME = "intfloat/multilingual-e5-base"
+# Query embedder: "torch", "onnx" (fp32 export) or "onnx-int8" (dynamically
+# quantized). Document vectors always come from the PyTorch model, so the
+# index stays the same whichever backend answers queries.
+EMBEDDING_BACKEND = "torch"
+# ONNX Runtime intra-op threads, 0 = one per physical core
+EMBEDDING_ONNX_THREADS = 0
+# Versioned index artifact (dense index, chunk store, BM25), opened with mmap
+INDEX_PATH = "rag_index"
+SOURCE_FILES = ("tnb_genelgeler_rag.json", "noterlik_kanunu_rag.json")
+LEGACY_INDEX_PATHS = ("faiss_index", "bm25_index.npz", "bm25_retriever.pkl")
+# Dense index type ("flat", "hnsw", "ivf_flat", "ivf_pq") and its build /
+# search parameters; changing ef_search / nprobe does not require a rebuild.
+# quantization="sq8" (~4x smaller) or "binary" (~32x, float rescoring from an
+# mmapped file) and pca_dim=256 shrink the in-memory vectors further.
+DENSE_INDEX_PARAMS = DenseIndexParams(index_type="flat")
+# Keep the "GENELGE NO … / Madde …" header lines out of the BM25 keyword field
+BM25_EXCLUDE_HEADER = False
+# "rrf" (reciprocal rank fusion) or "weighted" (min-max normalized scores)
+RETRIEVAL_FUSION = "rrf"
+# Generation backend (see generation_backends.GENERATION_BACKENDS):
+# "hf-endpoint" (Inference API, needs HF_TOKEN), "stand-in" (a server at
+# LLM_ENDPOINT_URL speaking the same API, e.g. standin_llm_server.py) or
+# "llama-cpp" (LLM_GGUF_PATH on CPU)
+LLM_BACKEND = "hf-endpoint"
+LLM_REPO_ID = "Qwen/Qwen2.5-7B-Instruct"
+LLM_ENDPOINT_URL = "http://127.0.0.1:8080"
+LLM_GGUF_PATH = "models/qwen2.5-7b-instruct-q4_k_m.gguf"
+LLM_THREADS = 0
+# Managed HTTP client of the "hf-endpoint" and "stand-in" backends: a
+# persistent (HTTP/2 when h2 is installed) pool, jittered exponential retry
+# of 5xx / 429 / transport errors, a circuit breaker that fails fast after
+# LLM_BREAKER_FAILURES consecutive failures for LLM_BREAKER_RESET seconds,
+# and optional hedging (a second copy after the p95 latency, first reply
+# wins; non-streaming calls only). "stand-in" always uses it; "hf-endpoint"
+# only with LLM_MANAGED_CLIENT, since the router's chat completions API has no
+# repetition_penalty and answers would change. False keeps ChatHuggingFace.
+LLM_MANAGED_CLIENT = False
+LLM_POOL_SIZE = 16
+LLM_HTTP2 = True
+LLM_RETRY_ATTEMPTS = 3
+LLM_RETRY_BASE_DELAY = 0.25
+LLM_HEDGE = False
+LLM_BREAKER_FAILURES = 5
+LLM_BREAKER_RESET = 30.0
+# Async API: requests in flight toward the LLM endpoint and how many may wait
+LLM_MAX_CONCURRENCY = 4
+LLM_MAX_QUEUE = 32
+LLM_QUEUE_TIMEOUT = 30.0
+RETRIEVAL_WORKERS = 4
+# Cross-encoder rerank: over-fetch RERANK_CANDIDATES per leg, keep the best
+# RERANK_TOP_N; past RERANK_TIME_BUDGET seconds unscored candidates keep the fused order
+RERANK_ENABLED = False
+RERANK_MODEL_NAME = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+RERANK_CANDIDATES = 20
+RERANK_TOP_N = 4
+RERANK_TIME_BUDGET = 0.3
+RERANK_THREADS = 0
+# Context packing: chunks of one article are merged under a single header
+# (split overlap removed) and packed best first into CONTEXT_TOKEN_BUDGET
+# tokens of the LLM's tokenizer; False joins the chunks as the "stuff" chain did
+CONTEXT_PACKING = True
+CONTEXT_TOKEN_BUDGET = 2048
+CONTEXT_TOKENIZER = "Qwen/Qwen2.5-7B-Instruct"
+# Concurrent query embeddings arriving within QUERY_BATCH_MAX_WAIT seconds
+# (up to QUERY_BATCH_MAX_SIZE) share one forward pass
+QUERY_BATCH_ENABLED = True
+QUERY_BATCH_MAX_SIZE = 16
+QUERY_BATCH_MAX_WAIT = 0.005
+# Answer cache: exact + semantic (cosine of e5 query embeddings) lookups
+ANSWER_CACHE_ENABLED = True
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL = 7 * 24 * 3600
+ANSWER_CACHE_THRESHOLD = 0.95
+# New answers are written to disk in the background at most this often (seconds)
+ANSWER_CACHE_FLUSH_INTERVAL = 5.0
+# Retrieval run by start_warmup() so the first user query finds the embedder
+# and the index pages already loaded
+WARMUP_QUESTION = "Noterlik Kanunu Madde 1 nedir?"
+# Stage latency histograms and query / cache / error / token counters are
+# served for Prometheus at http://<host>:METRICS_PORT/metrics (see metrics.py)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
-    try:
-        with open("tnb_genelgeler_rag.json", "r", encoding="utf-8") as f:
-            genelge_data = json.load(f)
-        print(f"✅ Loaded {len(genelge_data)} chunks from tnb_genelgeler_rag.json")
+_retriever: Optional[HybridRetriever] = None
+_llm: Optional[BaseChatModel] = None
+_prompt_template: Optional[PromptTemplate] = None
+_answer_cache: Optional[AnswerCache] = None
+_query_batcher: Optional[QueryBatcher] = None
+_context_packer: Optional[ContextPacker] = None
+# Tokens of the prompt template itself, for counting prompt tokens when the LLM doesn't report them
+_prompt_template_tokens = 0
+_initialized = False
+_init_lock = threading.Lock()
+# Set once the background warmup has finished, successfully or not
+_ready = threading.Event()
+_warmup_thread: Optional[threading.Thread] = None
+_startup_timer = PhaseTimer()
 
-        for item in genelge_data:
-            if "source_type" not in item.get("metadata", {}):
-                item.setdefault("metadata", {})["source_type"] = "genelge"
-            documents.append(
-                Document(
-                    page_content=item.get("content", ""),
-                    metadata=item.get("metadata", {}),
-                )
-            )
+_llm_limiter = ConcurrencyLimiter(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_queue=LLM_MAX_QUEUE,
+    queue_timeout=LLM_QUEUE_TIMEOUT,
+)
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval"
+)
 
-    except FileNotFoundError:
-        print("⚠️  tnb_genelgeler_rag.json not found. Please upload data files.")
+REGISTRY.gauge("rag_ready", "1 once the RAG system is initialized and warmed up", lambda: float(is_ready()))
+REGISTRY.gauge("rag_llm_queue", "State of the async LLM request queue", lambda: get_queue_stats(), ["state"])
+REGISTRY.gauge(
+    "rag_generation_client",
+    "Generation client counters (requests, retries, hedges, connections, ...)",
+    lambda: {name: value for name, value in get_generation_stats().items() if isinstance(value, (int, float))},
+    ["counter"],
+)
 
-    try:
-        with open("noterlik_kanunu_rag.json", "r", encoding="utf-8") as f:
-            kanun_data = json.load(f)
-        print(f"✅ Loaded {len(kanun_data)} chunks from noterlik_kanunu_rag.json")
 
-        for item in kanun_data:
-            documents.append(
-                Document(
-                    page_content=item.get("content", ""),
-                    metadata=item.get("metadata", {}),
-                )
-            )
+def configure_logging(level: Optional[str] = None):
+    """
+    Log to stderr at level (LOG_LEVEL by default) with bare messages, as the
+    progress prints looked. DEBUG adds per-query stage timings.
+    """
+    logging.basicConfig(level=(level or LOG_LEVEL).upper(), format="%(message)s")
+    # httpx logs every request to the generation endpoint at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
 
-    except FileNotFoundError:
-        print("⚠️  noterlik_kanunu_rag.json not found. Please upload data files.")
 
-    if not documents:
-        print("❌ No documents loaded. Please prepare data files first.")
-        _initialized = False
+def init_rag(
+    update_index: bool = True,
+    llm: Optional[BaseChatModel] = None,
+    embedding_backend: Optional[str] = None,
+    llm_backend: Optional[str] = None,
+):
+    """
+    Open the index artifact, updating it first when the data files or build
+    settings changed (update_index=False skips the data file check), and
+    build the query pipeline. Pass llm to use another chat model directly,
+    llm_backend to override LLM_BACKEND (e.g. "stand-in" for load tests) and
+    embedding_backend to override EMBEDDING_BACKEND for query embeddings.
+    """
+    global _retriever, _llm, _prompt_template, _answer_cache, _query_batcher, _context_packer, _prompt_template_tokens
+    global _initialized
+
+    if _initialized:
         return
 
-    print(f"📚 Total documents loaded: {len(documents)}")
+    HF_TOKEN = os.getenv("HF_TOKEN")
+    if not HF_TOKEN and llm is None and (llm_backend or LLM_BACKEND) == "hf-endpoint":
+        logger.warning("⚠️  HF_TOKEN not found in environment variables. Set it in Spaces secrets or .env file")
 
-    faiss_index_path = "faiss_index"
+    with _startup_timer.phase("imports"):
+        from langchain_core.prompts import PromptTemplate
 
-    print("🔄 Initializing embedding model (multilingual-e5-base)...")
-    embedding_model = HuggingFaceEmbeddings(
-        model_name="intfloat/multilingual-e5-base", encode_kwargs={"batch_size": 32}
-    )
-    print("✅ Embedding model initialized")
+        from answer_cache import AnswerCache
+        from article_lookup import ArticleIndex
+        from bm25_index import BM25IndexRetriever
+        from hybrid_retriever import HybridRetriever
+        from index_artifact import IndexArtifact, read_header
+        from query_batcher import QueryBatcher
+
+    analyzer = TurkishAnalyzer(exclude_header=BM25_EXCLUDE_HEADER)
 
-    # Load or create FAISS index
-    if os.path.exists(faiss_index_path):
-        print(f"✅ Found existing FAISS index at {faiss_index_path} — loading...")
+    logger.info("🔄 Initializing embedding model (multilingual-e5-base, %s)...", embedding_backend or EMBEDDING_BACKEND)
+    with _startup_timer.phase("embedder"):
+        embedding_model = create_embedding_model(embedding_backend)
+    logger.info("✅ Embedding model initialized")
+
+    # Worker processes serving the same INDEX_PATH take turns here: the first
+    # one builds or updates the index, the others then find it current
+    with file_lock(f"{INDEX_PATH}.lock"):
+        artifact = None
+        header = read_header(INDEX_PATH)
+        if header is not None and _artifact_is_current(header, analyzer, update_index):
+            try:
+                with _startup_timer.phase("index_mmap"):
+                    artifact = IndexArtifact.open(INDEX_PATH, DENSE_INDEX_PARAMS)
+                logger.info(
+                    "✅ Index loaded from %s (mmap, %s, %s chunks)",
+                    INDEX_PATH,
+                    artifact.dense.params.describe(),
+                    len(artifact.chunks),
+                )
+            except Exception as e:
+                logger.error("❌ Failed to open index artifact: %s", e)
+
+        if artifact is None:
+            with _startup_timer.phase("index_build"):
+                if not _build_index(embedding_model, analyzer):
+                    _initialized = False
+                    return
+                artifact = IndexArtifact.open(INDEX_PATH, DENSE_INDEX_PARAMS)
+
+    reranker = None
+    if RERANK_ENABLED:
+        logger.info("🔄 Loading reranker (%s)...", RERANK_MODEL_NAME)
         try:
-            vector_db = FAISS.load_local(
-                faiss_index_path, embedding_model, allow_dangerous_deserialization=True
-            )
-            print("✅ FAISS index loaded successfully!")
+            with _startup_timer.phase("reranker"):
+                from reranker import Reranker
+
+                reranker = Reranker(
+                    RERANK_MODEL_NAME,
+                    top_n=RERANK_TOP_N,
+                    time_budget=RERANK_TIME_BUDGET,
+                    threads=RERANK_THREADS,
+                )
+                reranker.warmup()
+            logger.info("✅ Reranker loaded")
         except Exception as e:
-            print(f"❌ Failed to load FAISS index: {e}")
-            print(f"🔄 Creating new FAISS index...")
-            vector_db = FAISS.from_documents(documents, embedding_model)
-            vector_db.save_local(faiss_index_path)
-            print(f"✅ FAISS index created and saved to {faiss_index_path}")
-    else:
-        print(f"🔄 Creating new FAISS index (this may take a few minutes)...")
-        vector_db = FAISS.from_documents(documents, embedding_model)
-        vector_db.save_local(faiss_index_path)
-        print(f"✅ FAISS index created and saved to {faiss_index_path}")
-
-    bm25_path = "bm25_retriever.pkl"
-    if os.path.exists(bm25_path):
-        print(f"✅ Loading existing BM25 index from {bm25_path}...")
-        with open(bm25_path, "rb") as f:
-            bm25_retriever = pickle.load(f)
-        print(f"✅ BM25 index loaded successfully!")
-    else:
-        print(f"🔄 Creating new BM25 index...")
-        bm25_retriever = BM25Retriever.from_documents(documents)
-        bm25_retriever.k = 5
-        with open(bm25_path, "wb") as f:
-            pickle.dump(bm25_retriever, f)
-        print(f"✅ BM25 index created and saved to {bm25_path}")
+            logger.warning("⚠️  Reranker unavailable, using the fused order: %s", e)
 
-    vector_retriever = vector_db.as_retriever(search_kwargs={"k": 5})
+    with _startup_timer.phase("retriever"):
+        query_embeddings = embedding_model
+        if QUERY_BATCH_ENABLED:
+            _query_batcher = QueryBatcher(
+                embedding_model,
+                max_batch_size=QUERY_BATCH_MAX_SIZE,
+                max_wait=QUERY_BATCH_MAX_WAIT,
+            )
+            query_embeddings = _query_batcher
 
-    ensemble_retriever = EnsembleRetriever(
-        retrievers=[bm25_retriever, vector_retriever], weights=[0.5, 0.5]
-    )
+        bm25_retriever = BM25IndexRetriever(
+            index=artifact.bm25,
+            docstore=artifact.chunks,
+            preprocess_func=analyzer,
+            k=5,
+        )
 
-    print("🔄 Initializing HuggingFace LLM (Qwen2.5-7B-Instruct)...")
-    try:
-        llm_endpoint = HuggingFaceEndpoint(
-            repo_id="Qwen/Qwen2.5-7B-Instruct",
-            huggingfacehub_api_token=HF_TOKEN,
-            temperature=0.3,
-            max_new_tokens=1024,
-            top_p=0.95,
-            repetition_penalty=1.1,
+        hybrid_retriever = HybridRetriever(
+            dense=artifact.dense,
+            docstore=artifact.chunks,
+            embeddings=query_embeddings,
+            bm25=bm25_retriever,
+            k_dense=RERANK_CANDIDATES if reranker else 5,
+            k_sparse=RERANK_CANDIDATES if reranker else 5,
+            fusion=RETRIEVAL_FUSION,
+            dense_weight=0.5,
+            sparse_weight=0.5,
+            filter_index=artifact.filters,
+            article_index=ArticleIndex.from_filter_index(artifact.filters, artifact.chunks.chunk_ids),
+            reranker=reranker,
+            rerank_candidates=RERANK_CANDIDATES,
         )
 
-        llm = ChatHuggingFace(llm=llm_endpoint)
-        print("✅ HuggingFace LLM initialized (Qwen2.5-7B-Instruct)")
-    except Exception as e:
-        print(f"❌ Failed to initialize LLM: {e}")
-        print(f"   HF_TOKEN is {'set' if HF_TOKEN else 'NOT set'}")
-        _initialized = False
-        return
+    context_packer = None
+    if CONTEXT_PACKING:
+        with _startup_timer.phase("tokenizer"):
+            from context_packer import load_token_counter
+
+            context_packer = ContextPacker(
+                load_token_counter(CONTEXT_TOKENIZER),
+                budget=CONTEXT_TOKEN_BUDGET,
+                article_index=hybrid_retriever.article_index,
+            )
+
+    if llm is None:
+        backend = llm_backend or LLM_BACKEND
+        logger.info("🔄 Initializing LLM (%s, %s)...", backend, LLM_REPO_ID)
+        try:
+            with _startup_timer.phase("llm_client"):
+                from generation_backends import create_llm
+                from generation_client import CircuitBreaker, RetryPolicy
+
+                llm = create_llm(
+                    backend,
+                    repo_id=LLM_REPO_ID,
+                    endpoint_url=LLM_ENDPOINT_URL,
+                    model_path=LLM_GGUF_PATH,
+                    token=HF_TOKEN,
+                    threads=LLM_THREADS,
+                    managed_client=LLM_MANAGED_CLIENT,
+                    client_options={
+                        "max_connections": LLM_POOL_SIZE,
+                        "max_keepalive_connections": LLM_POOL_SIZE,
+                        "http2": LLM_HTTP2,
+                        "retry": RetryPolicy(max_attempts=LLM_RETRY_ATTEMPTS, base_delay=LLM_RETRY_BASE_DELAY),
+                        "breaker": CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET),
+                        "hedge": LLM_HEDGE,
+                    },
+                )
+            logger.info("✅ LLM initialized (%s)", backend)
+        except Exception as e:
+            logger.error("❌ Failed to initialize LLM: %s", e)
+            if backend == "hf-endpoint":
+                logger.error("   HF_TOKEN is %s", "set" if HF_TOKEN else "NOT set")
+            _initialized = False
+            return
 
     turkish_legal_prompt = """Sen Türk Noter Hukuku konusunda uzman bir yapay zeka asistanısın. Görevin, Noterlik Kanunu ve Türkiye Noterler Birliği genelgelerinden yararlanarak kullanıcının sorusunu doğru ve eksiksiz yanıtlamaktır.
 
@@ -172,42 +366,718 @@ def init_rag():
         template=turkish_legal_prompt, input_variables=["context", "question"]
     )
 
-    _qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=ensemble_retriever,
-        chain_type="stuff",
-        chain_type_kwargs={"prompt": prompt_template, "document_separator": "\n---\n"},
-        return_source_documents=True,
-        verbose=False,
+    if ANSWER_CACHE_ENABLED:
+        with _startup_timer.phase("answer_cache"):
+            _answer_cache = AnswerCache(
+                path="answer_cache",
+                max_entries=ANSWER_CACHE_SIZE,
+                ttl=ANSWER_CACHE_TTL,
+                similarity_threshold=ANSWER_CACHE_THRESHOLD,
+                flush_interval=ANSWER_CACHE_FLUSH_INTERVAL,
+                index_fingerprint=manifest_fingerprint(os.path.join(INDEX_PATH, "manifest.json")),
+            )
+        logger.info("✅ Answer cache ready (%s entries)", _answer_cache.stats()["entries"])
+
+    _retriever = hybrid_retriever
+    _llm = llm
+    _prompt_template = prompt_template
+    _context_packer = context_packer
+    if context_packer is not None:
+        _prompt_template_tokens = context_packer.count_tokens(prompt_template.format(context="", question=""))
+
+    logger.info("✅ RAG system initialized successfully!")
+    logger.info(_startup_timer.report())
+    _initialized = True
+
+
+def create_embedding_model(backend: Optional[str] = None) -> CachedEmbeddings:
+    """
+    Cached document embedder plus the query embedder chosen by backend
+    (EMBEDDING_BACKEND by default). With an ONNX backend the PyTorch model is
+    only loaded when a document is missing from the embedding cache.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    from embedding_cache import CachedEmbeddings, LazyEmbeddings
+
+    backend = backend or EMBEDDING_BACKEND
+
+    def torch_embedder() -> HuggingFaceEmbeddings:
+        return HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME, encode_kwargs={"batch_size": 32}
+        )
+
+    if backend == "torch":
+        return CachedEmbeddings(torch_embedder(), model_name=EMBEDDING_MODEL_NAME)
+    if backend not in ("onnx", "onnx-int8"):
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    from onnx_embeddings import create_onnx_embeddings
+
+    return CachedEmbeddings(
+        LazyEmbeddings(torch_embedder),
+        model_name=EMBEDDING_MODEL_NAME,
+        query_embedder=create_onnx_embeddings(
+            EMBEDDING_MODEL_NAME,
+            quantize=backend == "onnx-int8",
+            threads=EMBEDDING_ONNX_THREADS,
+        ),
+    )
+
+
+def load_documents() -> List[Document]:
+    documents = []
+    seen_ids = {}
+
+    try:
+        with open("tnb_genelgeler_rag.json", "r", encoding="utf-8") as f:
+            genelge_data = json.load(f)
+        logger.info("✅ Loaded %s chunks from tnb_genelgeler_rag.json", len(genelge_data))
+
+        for item in genelge_data:
+            if "source_type" not in item.get("metadata", {}):
+                item.setdefault("metadata", {})["source_type"] = "genelge"
+            documents.append(_item_to_document(item, seen_ids))
+
+    except FileNotFoundError:
+        logger.warning("⚠️  tnb_genelgeler_rag.json not found. Please upload data files.")
+
+    try:
+        with open("noterlik_kanunu_rag.json", "r", encoding="utf-8") as f:
+            kanun_data = json.load(f)
+        logger.info("✅ Loaded %s chunks from noterlik_kanunu_rag.json", len(kanun_data))
+
+        for item in kanun_data:
+            documents.append(_item_to_document(item, seen_ids))
+
+    except FileNotFoundError:
+        logger.warning("⚠️  noterlik_kanunu_rag.json not found. Please upload data files.")
+
+    return documents
+
+
+def _item_to_document(item: dict, seen_ids: dict) -> Document:
+    from langchain_core.documents import Document
+
+    content = item.get("content", "")
+    metadata = dict(item.get("metadata", {}))
+    metadata["chunk_id"] = unique_chunk_id(item.get("id"), content, seen_ids)
+    return Document(page_content=content, metadata=metadata)
+
+
+def _artifact_is_current(header: Dict, analyzer: TurkishAnalyzer, check_sources: bool) -> bool:
+    from index_artifact import source_fingerprint
+
+    if header.get("embedding_model") != EMBEDDING_MODEL_NAME:
+        logger.warning("⚠️  Embedding model changed since the index was built")
+        return False
+    if header.get("dense_build_key") != DENSE_INDEX_PARAMS.build_key():
+        logger.warning("⚠️  FAISS index type or build parameters changed, rebuilding")
+        return False
+    if header.get("analyzer") != analyzer.config():
+        logger.warning("⚠️  BM25 analyzer settings changed")
+        return False
+    if check_sources and header.get("sources") != source_fingerprint(SOURCE_FILES):
+        logger.info("🔄 Data files changed since the index was built, checking for updates")
+        return False
+    return True
+
+
+def _build_index(embedding_model: CachedEmbeddings, analyzer: TurkishAnalyzer) -> bool:
+    """
+    Bring INDEX_PATH up to date with the JSON data files: apply the manifest
+    diff to the existing dense index when possible, otherwise rebuild it from
+    the embedding cache, then rewrite the chunk store and BM25 arrays.
+    """
+    from bm25_index import BM25Index
+    from dense_index import DenseIndex, is_dense_index
+    from index_artifact import source_fingerprint, write_artifact
+
+    documents = load_documents()
+
+    if not documents:
+        logger.error("❌ No documents loaded. Please prepare data files first.")
+        return False
+
+    logger.info("📚 Total documents loaded: %s", len(documents))
+
+    manifest_path = os.path.join(INDEX_PATH, "manifest.json")
+    new_manifest = {
+        doc.metadata["chunk_id"]: content_hash(doc.page_content, doc.metadata)
+        for doc in documents
+    }
+
+    for legacy_path in LEGACY_INDEX_PATHS:
+        if os.path.exists(legacy_path):
+            logger.warning(
+                "⚠️  %s was written by an older version and is no longer used, it can be deleted", legacy_path
+            )
+
+    dense_index = None
+    diff = None
+    if is_dense_index(INDEX_PATH):
+        logger.info("✅ Found existing FAISS index at %s — loading...", INDEX_PATH)
+        try:
+            dense_index = DenseIndex.load(INDEX_PATH, DENSE_INDEX_PARAMS)
+            logger.info(
+                "✅ FAISS index loaded successfully! (%s, %s vectors)",
+                dense_index.params.describe(),
+                dense_index.ntotal,
+            )
+        except Exception as e:
+            logger.error("❌ Failed to load FAISS index: %s", e)
+
+        if (
+            dense_index is not None
+            and dense_index.params.build_key() != DENSE_INDEX_PARAMS.build_key()
+        ):
+            dense_index = None
+
+        if dense_index is not None:
+            old_manifest = load_manifest(manifest_path)
+            if old_manifest is None:
+                logger.warning("⚠️  No index manifest found, rebuilding once to key the index on chunk_id")
+                dense_index = None
+            elif set(old_manifest) != {chunk_id for chunk_id in dense_index.ids if chunk_id is not None}:
+                # An interrupted save left the manifest and the vectors out of step;
+                # diffing against it would add or drop chunks twice
+                logger.warning("⚠️  Index manifest does not match the FAISS index, rebuilding")
+                dense_index = None
+            else:
+                diff = diff_manifest(old_manifest, new_manifest)
+                if not diff.is_empty and not dense_index.supports_removal:
+                    # Unchanged chunks come straight from the embedding cache
+                    logger.info("🔄 %s index cannot drop vectors, rebuilding", dense_index.params.index_type)
+                    dense_index = None
+
+    if dense_index is None:
+        logger.info(
+            "🔄 Creating new FAISS index (%s, this may take a few minutes)...", DENSE_INDEX_PARAMS.describe()
+        )
+        dense_index = DenseIndex.build(
+            embedding_model.embed_documents_array([doc.page_content for doc in documents]),
+            [doc.metadata["chunk_id"] for doc in documents],
+            replace(DENSE_INDEX_PARAMS),
+        )
+        logger.info("✅ FAISS index created")
+        logger.info("📊 %s", embedding_model.report())
+    elif not diff.is_empty:
+        logger.info("🔄 Updating FAISS index incrementally (%s)...", diff.summary())
+        _apply_manifest_diff(dense_index, embedding_model, documents, diff)
+        logger.info("✅ FAISS index updated")
+        logger.info("📊 %s", embedding_model.report())
+
+    logger.info("🔄 Creating BM25 index...")
+    bm25_index = BM25Index.build(
+        [analyzer.analyze_document(doc.page_content) for doc in documents],
+        [doc.metadata["chunk_id"] for doc in documents],
+        params={"analyzer": analyzer.config()},
     )
 
-    if _qa_chain is None:
-        print("❌ QA Chain creation failed silently")
+    write_artifact(
+        INDEX_PATH,
+        documents,
+        bm25_index,
+        dense_index,
+        header={
+            "sources": source_fingerprint(SOURCE_FILES),
+            "embedding_model": EMBEDDING_MODEL_NAME,
+            "dense_build_key": DENSE_INDEX_PARAMS.build_key(),
+            "analyzer": analyzer.config(),
+        },
+        manifest=new_manifest,
+    )
+    logger.info("✅ Index saved to %s", INDEX_PATH)
+    return True
+
+
+def _apply_manifest_diff(
+    dense_index: DenseIndex,
+    embedding_model: CachedEmbeddings,
+    documents: List[Document],
+    diff: ManifestDiff,
+):
+    dense_index.remove(diff.changed + diff.removed)
+
+    fresh_ids = set(diff.added + diff.changed)
+    fresh_docs = [doc for doc in documents if doc.metadata["chunk_id"] in fresh_ids]
+    if fresh_docs:
+        dense_index.add(
+            embedding_model.embed_documents_array([doc.page_content for doc in fresh_docs]),
+            [doc.metadata["chunk_id"] for doc in fresh_docs],
+        )
+
+
+def _prepare(
+    question: str,
+    filters: Optional[Filters] = None,
+) -> Tuple[Optional[Dict], List[Document], Dict[str, float], Optional[List[float]]]:
+    """
+    Answer-cache lookup followed, on a miss, by retrieval.
+    Returns (cached result or None, documents, timings, query embedding).
+    Filtered questions skip the answer cache, whose answers are unscoped.
+    """
+    timings: Dict[str, float] = {}
+    query_embedding = None
+
+    if _answer_cache is not None and not active_filters(filters):
+        from answer_cache import normalize_question
+
+        with span(timings, "normalize"):
+            key = normalize_question(question)
+        cached = _answer_cache.get_exact(question, key)
+        if cached is not None:
+            ANSWER_CACHE_LOOKUPS.inc(result="exact")
+            cached["cached"] = "exact"
+            return cached, cached["source_documents"], timings, None
+
+        # The embedding is computed once and reused by the dense leg on a miss
+        with span(timings, "embed"):
+            query_embedding = _retriever.embeddings.embed_query(question)
+
+        cached = _answer_cache.get_similar(question, query_embedding, key)
+        if cached is not None:
+            ANSWER_CACHE_LOOKUPS.inc(result="semantic")
+            cached["cached"] = "semantic"
+            return cached, cached["source_documents"], timings, None
+        ANSWER_CACHE_LOOKUPS.inc(result="miss")
+
+    scored_docs, retrieval_timings = _retriever.retrieve(question, query_embedding, filters)
+    for stage, seconds in retrieval_timings.as_dict().items():
+        timings[stage] = timings.get(stage, 0.0) + seconds
+    return None, [doc for doc, _ in scored_docs], timings, query_embedding
+
+
+def _store_answer(question: str, query_embedding: Optional[List[float]], result: Dict):
+    if _answer_cache is None or query_embedding is None or not result["result"]:
         return
+    try:
+        _answer_cache.put(question, query_embedding, result)
+    except Exception as e:
+        logger.warning("⚠️  Could not store answer in cache: %s", e)
 
-    print("✅ RAG system initialized successfully!\n")
-    _initialized = True
 
+def _build_prompt(question: str, docs: List[Document]) -> Tuple[str, PackedContext]:
+    """The prompt and the context it holds (context.documents are the chunks that fit)."""
+    if _context_packer is not None:
+        context = _context_packer.pack(docs)
+    else:
+        # Same layout the "stuff" chain produced
+        context = PackedContext(text="\n---\n".join(doc.page_content for doc in docs), documents=list(docs))
+    return _prompt_template.format(context=context.text, question=question), context
+
+
+def _record_query(api: str, result: Dict, usage: Optional[Dict[str, int]] = None):
+    """
+    Count an answered question, its stage timings and, for generated answers,
+    its tokens: as reported by the LLM (usage), otherwise counted with the
+    context packer's tokenizer; not counted when context packing is off.
+    """
+    timings = result["timings"]
+    QUERIES.inc(api=api, source=result.get("cached") or "llm")
+    observe_stages(timings)
+
+    if not result.get("cached"):
+        if usage:
+            TOKENS.inc(usage.get("input_tokens", 0), direction="prompt")
+            TOKENS.inc(usage.get("output_tokens", 0), direction="completion")
+        elif _context_packer is not None:
+            count = _context_packer.count_tokens
+            TOKENS.inc(_prompt_template_tokens + result["context_tokens"] + count(result["query"]), direction="prompt")
+            TOKENS.inc(count(result["result"]), direction="completion")
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "⏱️  %s query (%s): %s",
+            api,
+            result.get("cached") or "llm",
+            ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in timings.items()),
+        )
+
+
+def _record_error(api: str, error: BaseException):
+    ERRORS.inc(api=api, error=type(error).__name__)
+    logger.exception("❌ Error querying RAG: %s", error)
+
+
+def retrieve_context(question: str, filters: Optional[Filters] = None) -> Optional[Dict]:
+    """
+    Run retrieval and prompt building only, bypassing the answer cache.
+    Used by the benchmark and evaluation scripts.
+    """
+    if not _initialized:
+        _init_once()
+
+    if not _initialized or _retriever is None:
+        return None
+
+    scored_docs, retrieval_timings = _retriever.retrieve(question, filters=filters)
+    timings = retrieval_timings.as_dict()
+    docs = [doc for doc, _ in scored_docs]
+
+    with span(timings, "prompt_build"):
+        prompt, context = _build_prompt(question, docs)
+
+    return {
+        "query": question,
+        "source_documents": context.documents,
+        "prompt": prompt,
+        "context_tokens": context.tokens,
+        "timings": timings,
+    }
 
-def query_rag(question: str):
-    global _qa_chain, _initialized
+
+def query_rag(question: str, filters: Optional[Filters] = None):
+    """
+    Answer a question. filters restricts retrieval by metadata, e.g.
+    {"source_type": "genelge", "genelge_no": 45} (see metadata_filter.FILTER_FIELDS).
+    """
+    global _initialized
 
     if not _initialized:
-        init_rag()
+        _init_once()
 
-    if not _initialized or _qa_chain is None:
-        print("❌ RAG system is not properly initialized. Chain or data missing.")
+    if not _initialized or _retriever is None or _llm is None:
+        ERRORS.inc(api="sync", error="NotInitialized")
+        logger.error("❌ RAG system is not properly initialized. Chain or data missing.")
         return None
 
     try:
-        print(f"DEBUG: _qa_chain type: {type(_qa_chain)}")
-        print(f"DEBUG: _qa_chain.invoke type: {type(_qa_chain.invoke)}")
-        print(f"DEBUG: Calling invoke with question: {question[:50]}...")
-        result = _qa_chain.invoke({"query": question})
+        logger.debug("Querying with question: %.50s...", question)
+        started = time.perf_counter()
+        cached, docs, timings, query_embedding = _prepare(question, filters)
+        if cached is not None:
+            timings["total"] = time.perf_counter() - started
+            cached["timings"] = timings
+            _record_query("sync", cached)
+            return cached
+
+        with span(timings, "prompt_build"):
+            prompt, context = _build_prompt(question, docs)
+
+        with span(timings, "generation"):
+            message = _llm.invoke(prompt)
+        timings["total"] = time.perf_counter() - started
+
+        result = {
+            "query": question,
+            "result": message.content,
+            "source_documents": context.documents,
+            "context_tokens": context.tokens,
+            "timings": timings,
+        }
+        _record_query("sync", result, getattr(message, "usage_metadata", None))
+        _store_answer(question, query_embedding, result)
         return result
     except Exception as e:
-        print(f"❌ Error querying RAG: {e}")
-        import traceback
+        _record_error("sync", e)
+        return None
+
+
+def stream_rag(question: str, filters: Optional[Filters] = None) -> Iterator[Dict]:
+    """
+    Streaming variant of query_rag.
+
+    Yields {"type": "token", "text": ...} events as the LLM produces them and a
+    final {"type": "done", ...} event carrying the full answer, the source
+    documents and timings (time-to-first-token is reported as "ttft").
+    On failure a single {"type": "error", "message": ...} event is yielded.
+    """
+    global _initialized
+
+    if not _initialized:
+        _init_once()
+
+    if not _initialized or _retriever is None or _llm is None:
+        ERRORS.inc(api="stream", error="NotInitialized")
+        logger.error("❌ RAG system is not properly initialized. Chain or data missing.")
+        yield {"type": "error", "message": "RAG system is not initialized"}
+        return
+
+    try:
+        started = time.perf_counter()
+        cached, docs, timings, query_embedding = _prepare(question, filters)
+        if cached is not None:
+            timings["ttft"] = timings["total"] = time.perf_counter() - started
+            cached["timings"] = timings
+            _record_query("stream", cached)
+            yield {"type": "token", "text": cached["result"]}
+            yield {"type": "done", **cached}
+            return
+
+        with span(timings, "prompt_build"):
+            prompt, context = _build_prompt(question, docs)
+
+        generation_started = time.perf_counter()
+        parts, usage = [], None
+        for chunk in _llm.stream(prompt):
+            if getattr(chunk, "usage_metadata", None):
+                usage = chunk.usage_metadata
+            if not chunk.content:
+                continue
+            if not parts:
+                timings["ttft"] = time.perf_counter() - started
+            parts.append(chunk.content)
+            yield {"type": "token", "text": chunk.content}
+
+        timings["generation"] = time.perf_counter() - generation_started
+        timings["total"] = time.perf_counter() - started
+
+        result = {
+            "query": question,
+            "result": "".join(parts),
+            "source_documents": context.documents,
+            "context_tokens": context.tokens,
+            "timings": timings,
+        }
+        _record_query("stream", result, usage)
+        _store_answer(question, query_embedding, result)
+        yield {"type": "done", **result}
+    except Exception as e:
+        _record_error("stream", e)
+        yield {"type": "error", "message": str(e)}
+
+
+async def aquery_rag(question: str, filters: Optional[Filters] = None):
+    """
+    Async variant of query_rag for serving many chat sessions from one loop.
+
+    Retrieval runs on a bounded thread pool off the event loop; the LLM call
+    waits for one of LLM_MAX_CONCURRENCY slots. Raises QueueFullError when
+    LLM_MAX_QUEUE requests are already waiting and QueueTimeoutError after
+    LLM_QUEUE_TIMEOUT seconds in the queue; other failures return None.
+    """
+    loop = asyncio.get_running_loop()
+
+    if not _initialized:
+        await loop.run_in_executor(_retrieval_executor, _init_once)
+
+    if not _initialized or _retriever is None or _llm is None:
+        ERRORS.inc(api="async", error="NotInitialized")
+        logger.error("❌ RAG system is not properly initialized. Chain or data missing.")
+        return None
+
+    try:
+        started = time.perf_counter()
+        cached, docs, timings, query_embedding = await loop.run_in_executor(
+            _retrieval_executor, _prepare, question, filters
+        )
+        if cached is not None:
+            timings["total"] = time.perf_counter() - started
+            cached["timings"] = timings
+            _record_query("async", cached)
+            return cached
 
-        traceback.print_exc()
+        with span(timings, "prompt_build"):
+            prompt, context = _build_prompt(question, docs)
+
+        timings["queue_wait"] = await _llm_limiter.acquire()
+        try:
+            with span(timings, "generation"):
+                message = await _llm.ainvoke(prompt)
+        finally:
+            _llm_limiter.release()
+        timings["total"] = time.perf_counter() - started
+
+        result = {
+            "query": question,
+            "result": message.content,
+            "source_documents": context.documents,
+            "context_tokens": context.tokens,
+            "timings": timings,
+        }
+        _record_query("async", result, getattr(message, "usage_metadata", None))
+        await loop.run_in_executor(
+            _retrieval_executor, _store_answer, question, query_embedding, result
+        )
+        return result
+    except (QueueFullError, QueueTimeoutError) as e:
+        ERRORS.inc(api="async", error=type(e).__name__)
+        raise
+    except Exception as e:
+        _record_error("async", e)
         return None
+
+
+async def astream_rag(question: str, filters: Optional[Filters] = None) -> AsyncIterator[Dict]:
+    """
+    Async variant of stream_rag, with the same events. Like aquery_rag it
+    retrieves on the thread pool and holds one of the LLM_MAX_CONCURRENCY
+    slots while streaming; QueueFullError / QueueTimeoutError are raised
+    before the first token.
+    """
+    loop = asyncio.get_running_loop()
+
+    if not _initialized:
+        await loop.run_in_executor(_retrieval_executor, _init_once)
+
+    if not _initialized or _retriever is None or _llm is None:
+        ERRORS.inc(api="astream", error="NotInitialized")
+        logger.error("❌ RAG system is not properly initialized. Chain or data missing.")
+        yield {"type": "error", "message": "RAG system is not initialized"}
+        return
+
+    try:
+        started = time.perf_counter()
+        cached, docs, timings, query_embedding = await loop.run_in_executor(
+            _retrieval_executor, _prepare, question, filters
+        )
+        if cached is not None:
+            timings["ttft"] = timings["total"] = time.perf_counter() - started
+            cached["timings"] = timings
+            _record_query("astream", cached)
+            yield {"type": "token", "text": cached["result"]}
+            yield {"type": "done", **cached}
+            return
+
+        with span(timings, "prompt_build"):
+            prompt, context = _build_prompt(question, docs)
+
+        timings["queue_wait"] = await _llm_limiter.acquire()
+        try:
+            generation_started = time.perf_counter()
+            parts, usage = [], None
+            async for chunk in _llm.astream(prompt):
+                if getattr(chunk, "usage_metadata", None):
+                    usage = chunk.usage_metadata
+                if not chunk.content:
+                    continue
+                if not parts:
+                    timings["ttft"] = time.perf_counter() - started
+                parts.append(chunk.content)
+                yield {"type": "token", "text": chunk.content}
+            timings["generation"] = time.perf_counter() - generation_started
+        finally:
+            _llm_limiter.release()
+        timings["total"] = time.perf_counter() - started
+
+        result = {
+            "query": question,
+            "result": "".join(parts),
+            "source_documents": context.documents,
+            "context_tokens": context.tokens,
+            "timings": timings,
+        }
+        _record_query("astream", result, usage)
+        await loop.run_in_executor(
+            _retrieval_executor, _store_answer, question, query_embedding, result
+        )
+        yield {"type": "done", **result}
+    except (QueueFullError, QueueTimeoutError) as e:
+        ERRORS.inc(api="astream", error=type(e).__name__)
+        raise
+    except Exception as e:
+        _record_error("astream", e)
+        yield {"type": "error", "message": str(e)}
+
+
+def _init_once(**init_kwargs):
+    # Queries arriving while start_warmup() is still initializing wait here
+    with _init_lock:
+        if not _initialized:
+            init_rag(**init_kwargs)
+
+
+def start_warmup(**init_kwargs) -> threading.Thread:
+    """
+    Run init_rag(**init_kwargs) and one retrieval on a background thread so
+    a UI can start serving immediately. is_ready() turns True (and
+    wait_until_ready() returns) once both are done; queries issued earlier
+    block until initialization finishes.
+    """
+    global _warmup_thread
+
+    with _init_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(
+                target=_warmup, kwargs=init_kwargs, name="rag-warmup", daemon=True
+            )
+            _warmup_thread.start()
+    return _warmup_thread
+
+
+def _warmup(**init_kwargs):
+    try:
+        _init_once(**init_kwargs)
+        if _initialized:
+            # First forward pass of the embedder and first touch of the mmapped pages
+            with _startup_timer.phase("warmup_query"):
+                _retriever.retrieve(WARMUP_QUESTION)
+            logger.info(
+                "✅ Warmup finished, ready %.2f s after start", time.perf_counter() - _startup_timer.started
+            )
+    except Exception as e:
+        logger.error("❌ Warmup failed: %s", e)
+    finally:
+        _ready.set()
+
+
+def is_ready() -> bool:
+    return _initialized and (_warmup_thread is None or _ready.is_set())
+
+
+def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    """Block until the background warmup finishes; False on timeout or failure."""
+    if _warmup_thread is not None:
+        _ready.wait(timeout)
+    return is_ready()
+
+
+def get_startup_status() -> str:
+    """"not_started", "warming_up", "ready" or "failed"."""
+    if _warmup_thread is not None and not _ready.is_set():
+        return "warming_up"
+    if _initialized:
+        return "ready"
+    return "failed" if _ready.is_set() else "not_started"
+
+
+def get_startup_timings() -> Dict[str, float]:
+    """Seconds spent in each startup phase (imports, embedder, index_mmap, ...)."""
+    return _startup_timer.as_dict()
+
+
+def get_queue_stats() -> Dict[str, int]:
+    """Current state of the LLM request queue used by aquery_rag."""
+    return _llm_limiter.stats()
+
+
+def flush_answer_cache():
+    """Write answers the cache hasn't saved yet, e.g. when a server worker shuts down."""
+    if _answer_cache is not None:
+        _answer_cache.flush()
+
+
+def get_filter_values(field: str) -> List[str]:
+    """Distinct values of a filterable metadata field, for building filter controls."""
+    if _retriever is None or _retriever.filter_index is None:
+        return []
+    return _retriever.filter_index.values(field)
+
+
+def get_retriever() -> Optional[HybridRetriever]:
+    return _retriever
+
+
+def get_retrieval_stats() -> Dict[str, Dict[str, float]]:
+    """Rolling p50/p95 latency of each retrieval stage."""
+    return _retriever.latency_summary() if _retriever is not None else {}
+
+
+def get_query_batch_stats() -> Dict:
+    """Batch-size and wait-time histograms of the query embedding micro-batcher."""
+    return _query_batcher.stats() if _query_batcher is not None else {}
+
+
+def get_rerank_stats() -> Dict[str, int]:
+    """How many queries were fully reranked, partly reranked and kept the fused order (over budget)."""
+    reranker = _retriever.reranker if _retriever is not None else None
+    return reranker.stats() if reranker is not None else {}
+
+
+def get_generation_stats() -> Dict:
+    """Connection pool, retry, hedge and circuit breaker counters of the generation client."""
+    from generation_client import GenerationClient
+
+    client = getattr(_llm, "client", None)
+    return client.stats() if isinstance(client, GenerationClient) else {}
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# Imported by llm_rag_setup at module level, so langchain stays out of it
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+FILTER_FIELDS = ("source_type", "genelge_no", "madde_no", "kisim", "bolum")
+
+# field -> one value or any of several values
+Filters = Mapping[str, Union[Any, Sequence[Any]]]
+
+
+def _normalize(value: Any) -> str:
+    return str(value).strip()
+
+
+def active_filters(filters: Optional[Filters]) -> Dict[str, Any]:
+    """The filters that actually restrict something (empty values dropped)."""
+    return {
+        field: wanted
+        for field, wanted in (filters or {}).items()
+        if wanted is not None and wanted != "" and wanted != []
+    }
+
+
+def _natural_key(value: str) -> Tuple:
+    return tuple(int(part) if part.isdigit() else part for part in re.split(r"(\d+)", value))
+
+
+class FilterIndex:
+    """
+    Per-field value codes for every chunk row, so a filter turns into a
+    boolean row mask with a few vectorized comparisons.
+
+    codes[field][row] is the position of the chunk's value in values[field]
+    (-1 when the chunk has no such field). Masks for values present in the
+    corpus are cached, so repeated filters only pay for combining them; the
+    cache is bounded by the number of distinct values.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self._codes = {
+            field: arrays[f"{field}.codes"] for field in FILTER_FIELDS if f"{field}.codes" in arrays
+        }
+        self._values = {field: arrays[f"{field}.values"] for field in self._codes}
+        self._masks: Dict[Tuple[str, int], np.ndarray] = {}
+        self.row_count = len(next(iter(self._codes.values()))) if self._codes else 0
+        # Shared by every value that matches nothing (they come from request bodies)
+        self._no_rows = np.zeros(self.row_count, dtype=bool)
+        self._no_rows.flags.writeable = False
+
+    @staticmethod
+    def to_arrays(documents: Sequence[Document]) -> Dict[str, np.ndarray]:
+        arrays = {}
+        for field in FILTER_FIELDS:
+            raw = [doc.metadata.get(field) for doc in documents]
+            keys = [_normalize(value) if value not in (None, "") else None for value in raw]
+            values = sorted({key for key in keys if key is not None})
+            positions = {value: i for i, value in enumerate(values)}
+            arrays[f"{field}.codes"] = np.array(
+                [positions[key] if key is not None else -1 for key in keys], dtype=np.int32
+            )
+            arrays[f"{field}.values"] = np.array(values, dtype=np.str_)
+        return arrays
+
+    def values(self, field: str) -> List[str]:
+        """Distinct values of a field, in natural order (Genelge 2 before Genelge 10)."""
+        if field not in self._values:
+            return []
+        return sorted(self._values[field].tolist(), key=_natural_key)
+
+    def row_values(self, field: str) -> List[Optional[str]]:
+        """Every row's (normalized) value of a field, None where it is missing."""
+        if field not in self._codes:
+            return [None] * self.row_count
+        values = self._values[field].tolist()
+        return [values[code] if code >= 0 else None for code in self._codes[field].tolist()]
+
+    def _value_mask(self, field: str, value: str) -> np.ndarray:
+        """Read-only mask of the rows whose field equals value."""
+        values = self._values[field]
+        pos = int(np.searchsorted(values, value))
+        if pos == len(values) or values[pos] != value:
+            return self._no_rows
+        key = (field, pos)
+        if key not in self._masks:
+            mask = self._codes[field] == pos
+            mask.flags.writeable = False
+            self._masks[key] = mask
+        return self._masks[key]
+
+    def mask(self, filters: Optional[Filters]) -> Optional[np.ndarray]:
+        """
+        Rows matching every field (any of the values given for a field), or
+        None when no filter is set. Empty values are ignored.
+        """
+        result = None
+        for field, wanted in active_filters(filters).items():
+            if field not in FILTER_FIELDS:
+                raise ValueError(f"Unknown filter field: {field} (expected one of {', '.join(FILTER_FIELDS)})")
+            if isinstance(wanted, (str, int)):
+                wanted = [wanted]
+
+            field_mask = np.zeros(self.row_count, dtype=bool)
+            if field in self._codes:
+                for value in wanted:
+                    field_mask |= self._value_mask(field, _normalize(value))
+            result = field_mask if result is None else result & field_mask
+        return result
+
+    def select(self, filters: Optional[Filters], rows: np.ndarray) -> Optional[np.ndarray]:
+        """mask() re-indexed onto another ordering of the chunks (rows[i] = chunk row, -1 = none)."""
+        mask = self.mask(filters)
+        if mask is None:
+            return None
+        return mask[np.maximum(rows, 0)] & (rows >= 0)
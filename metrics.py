@@ -0,0 +1,426 @@
+import bisect
+import glob
+import json
+import math
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Query stages run from sub-millisecond (lookup, fusion) to tens of seconds (generation)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def state(self):
+        """JSON-ready values, for merging the metric across processes."""
+        raise NotImplementedError
+
+    def merged(self, states: List) -> "_Metric":
+        """A copy of this metric holding the combined states of several processes."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(_Metric):
+    """Monotonic count per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+    def state(self) -> List:
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merged(self, states: List) -> "Counter":
+        counter = Counter(self.name, self.help, self.labelnames)
+        for state in states:
+            for key, value in state:
+                counter._values[tuple(key)] = counter._values.get(tuple(key), 0.0) + value
+        return counter
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label combination."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [count per bucket (+Inf last), sum]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._series.items())
+        lines = []
+        for key, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _label_text(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def state(self) -> List:
+        with self._lock:
+            return [[list(key), list(counts), total[0]] for key, (counts, total) in self._series.items()]
+
+    def merged(self, states: List) -> "Histogram":
+        histogram = Histogram(self.name, self.help, self.labelnames, self.buckets)
+        for state in states:
+            for key, counts, total in state:
+                if len(counts) != len(self.buckets) + 1:
+                    continue
+                series = histogram._series.setdefault(tuple(key), ([0] * len(counts), [0.0]))
+                for i, count in enumerate(counts):
+                    series[0][i] += count
+                series[1][0] += total
+        return histogram
+
+
+class Gauge(_Metric):
+    """Value read at scrape time from fn: a number, or {label value: number} for one label."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]], labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def samples(self) -> List[str]:
+        value = self.fn()
+        if isinstance(value, dict):
+            return [
+                f"{self.name}{_label_text(self.labelnames, (label,))} {_format_value(number)}"
+                for label, number in sorted(value.items())
+            ]
+        return [f"{self.name} {_format_value(value)}"]
+
+    def state(self):
+        return self.fn()
+
+    def merged(self, states: List) -> "Gauge":
+        """Sum over the processes, e.g. rag_ready counts the ready workers."""
+        total: Dict[str, float] = {}
+        for state in states:
+            for label, number in state.items() if isinstance(state, dict) else [("", state)]:
+                total[label] = total.get(label, 0.0) + number
+        value = total if self.labelnames else total.get("", 0.0)
+        return Gauge(self.name, self.help, lambda: value, self.labelnames)
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            # Re-registering a name (e.g. a module reloaded) replaces the old metric
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, fn, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return self._render(metrics)
+
+    def dump(self, directory: str):
+        """Write this process's metric states to directory/<run>-<pid>-<started>.json for render_merged."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        states = {}
+        for metric in metrics:
+            try:
+                states[metric.name] = metric.state()
+            except Exception:
+                # Rendered as unavailable by the scraped process when it fails there too
+                continue
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{_dump_key()}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(states, f)
+        os.replace(f"{path}.tmp", path)
+
+    def render_merged(self, directory: str) -> str:
+        """
+        Metrics of every process of this run dumping into directory, this one
+        included: counters and histograms are summed over all of them (exited
+        ones too, so totals never go backwards), gauges over the processes
+        still alive. Dumps of earlier runs are ignored.
+        """
+        self.dump(directory)
+        run = _run_id()
+        dumps = []
+        for path in glob.glob(os.path.join(directory, f"{run}-*.json")):
+            try:
+                pid, started = (int(part) for part in os.path.basename(path)[len(run) + 1 : -len(".json")].split("-"))
+                with open(path, "r", encoding="utf-8") as f:
+                    dumps.append((pid, started, json.load(f)))
+            except (OSError, ValueError):
+                continue
+
+        # A reused pid only makes its newest dump alive
+        newest: Dict[int, int] = {}
+        for pid, started, _ in dumps:
+            newest[pid] = max(newest.get(pid, started), started)
+        states: Dict[str, List] = {}
+        for pid, started, dumped in dumps:
+            alive = started == newest[pid] and _pid_alive(pid)
+            for name, state in dumped.items():
+                states.setdefault(name, []).append((state, alive))
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+        merged = []
+        for metric in metrics:
+            dumped = [state for state, alive in states.get(metric.name, []) if alive or not isinstance(metric, Gauge)]
+            try:
+                merged.append(metric.merged(dumped))
+            except (TypeError, ValueError):
+                merged.append(metric)
+        return self._render(merged)
+
+    @staticmethod
+    def _render(metrics: List[_Metric]) -> str:
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                # A failing gauge callback must not take the whole scrape down
+                blocks.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+        return "\n".join(blocks) + "\n"
+
+
+def _process_started(pid: int) -> str:
+    """Start time of a process in clock ticks (Linux), "" where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return ""
+
+
+def _run_id() -> str:
+    """
+    Shared by the workers of one server run: the supervisor process that
+    spawned them (or this process when it runs alone), told apart from an
+    earlier process with the same pid by its start time.
+    """
+    parent = multiprocessing.parent_process()
+    pid = parent.pid if parent is not None else os.getpid()
+    return f"{pid}.{_process_started(pid) or 0}"
+
+
+_DUMP_KEYS: Dict[int, str] = {}
+
+
+def _dump_key() -> str:
+    pid = os.getpid()
+    if pid not in _DUMP_KEYS:
+        _DUMP_KEYS[pid] = f"{_run_id()}-{pid}-{time.time_ns()}"
+    return _DUMP_KEYS[pid]
+
+
+def remove_stale_dumps(directory: str):
+    """Delete dumps left in directory by earlier runs."""
+    run = _run_id()
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        if not os.path.basename(path).startswith(f"{run}-"):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "rag_stage_seconds",
+    "Wall-clock seconds per query stage (normalize, embed, bm25, faiss, fusion, prompt_build, ttft, generation, ...)",
+    ["stage"],
+)
+QUERIES = REGISTRY.counter(
+    "rag_queries_total", "Answered questions by API and where the answer came from (llm, exact, semantic)", ["api", "source"]
+)
+ANSWER_CACHE_LOOKUPS = REGISTRY.counter(
+    "rag_answer_cache_lookups_total", "Answer cache lookups by result (exact, semantic, miss)", ["result"]
+)
+ERRORS = REGISTRY.counter("rag_errors_total", "Failed questions by API and exception type", ["api", "error"])
+TOKENS = REGISTRY.counter("rag_tokens_total", "LLM tokens by direction (prompt, completion)", ["direction"])
+
+
+@contextmanager
+def span(timings: Dict[str, float], stage: str) -> Iterator[None]:
+    """Add the seconds spent in the block to timings[stage]."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def observe_stages(timings: Dict[str, float], histogram: Histogram = STAGE_SECONDS):
+    """Record one query's stage timings; "total" is recorded as a stage too."""
+    for stage, seconds in timings.items():
+        histogram.observe(seconds, stage=stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: "MetricsServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], registry: Registry):
+        super().__init__(address, _MetricsHandler)
+        self.registry = registry
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+
+def start_metrics_dumper(directory: str, interval: float = 5.0, registry: Optional[Registry] = None) -> threading.Thread:
+    """Dump the registry into directory every interval seconds on a daemon thread (see Registry.render_merged)."""
+    registry = registry or REGISTRY
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                registry.dump(directory)
+            except OSError:
+                continue
+
+    registry.dump(directory)
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
+
+
+def start_metrics_server(host: str = "0.0.0.0", port: int = 9100, registry: Optional[Registry] = None) -> MetricsServer:
+    """Serve GET /metrics for Prometheus on a daemon thread (port 0 picks a free port)."""
+    server = MetricsServer((host, port), registry or REGISTRY)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
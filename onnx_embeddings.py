@@ -0,0 +1,212 @@
+import argparse
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+ONNX_EXPORT_DIR = "onnx_models"
+# Dynamic int8 kernels; avx2 runs on every x86-64 host, "avx512_vnni" or
+# "arm64" are faster where the CPU supports them
+QUANTIZATION_CONFIG = "avx2"
+PARITY_FILE = "parity.json"
+# Below this cosine between PyTorch and ONNX query vectors, rankings drift noticeably
+MIN_PARITY_COSINE = 0.99
+
+
+def export_dir(model_name: str) -> str:
+    return os.path.join(ONNX_EXPORT_DIR, re.sub(r"[^\w.-]+", "__", model_name))
+
+
+def onnx_file_name(quantize: bool) -> str:
+    return f"model_{_int8_suffix()}.onnx" if quantize else "model.onnx"
+
+
+def _int8_suffix() -> str:
+    # avx2 stores uint8 weights and the others int8; one name keeps the lookup simple
+    return f"int8_{QUANTIZATION_CONFIG}"
+
+
+def export_onnx_model(model_name: str, quantize: bool = True, model_class=None) -> str:
+    """
+    Export the sentence-transformers model to ONNX once (plus a dynamically
+    quantized int8 copy when asked) and return the export directory.
+    Pooling and normalization settings are saved with it, so the ONNX model
+    produces the same kind of vectors as HuggingFaceEmbeddings.
+    model_class defaults to SentenceTransformer; pass CrossEncoder for rerankers.
+    """
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.backend import export_dynamic_quantized_onnx_model
+
+    model_class = model_class or SentenceTransformer
+    path = export_dir(model_name)
+    if not os.path.exists(os.path.join(path, "onnx", onnx_file_name(False))):
+        logger.info("🔄 Exporting %s to ONNX (one time)...", model_name)
+        model_class(model_name, backend="onnx", device="cpu").save_pretrained(path)
+        logger.info("✅ ONNX model saved to %s", path)
+
+    if quantize and not os.path.exists(os.path.join(path, "onnx", onnx_file_name(True))):
+        logger.info("🔄 Quantizing ONNX model to int8 (%s)...", QUANTIZATION_CONFIG)
+        model = model_class(
+            path, backend="onnx", device="cpu", model_kwargs={"file_name": onnx_file_name(False)}
+        )
+        export_dynamic_quantized_onnx_model(
+            model, QUANTIZATION_CONFIG, path, file_suffix=_int8_suffix()
+        )
+        logger.info("✅ int8 ONNX model saved")
+    return path
+
+
+def session_options(threads: int = 0):
+    """
+    ONNX Runtime options for small per-request graph runs.
+    threads=0 leaves intra-op threads at ONNX Runtime's default (one per physical core).
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    # One request is a single small graph run; parallelism belongs inside the ops
+    options.inter_op_num_threads = 1
+    if threads:
+        options.intra_op_num_threads = threads
+    return options
+
+
+def create_onnx_embeddings(model_name: str, quantize: bool = True, threads: int = 0) -> Embeddings:
+    """HuggingFaceEmbeddings running the exported model on ONNX Runtime."""
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    path = export_onnx_model(model_name, quantize)
+    options = session_options(threads)
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=path,
+        model_kwargs={
+            "device": "cpu",
+            "backend": "onnx",
+            "model_kwargs": {
+                "file_name": onnx_file_name(quantize),
+                "provider": "CPUExecutionProvider",
+                "session_options": options,
+            },
+        },
+    )
+
+    report = load_parity_report(model_name, quantize)
+    if report is None:
+        logger.warning("⚠️  No ONNX parity report yet, run `python onnx_embeddings.py` to check cosine drift")
+    else:
+        logger.info("📊 ONNX parity (%s): %s", "int8" if quantize else "fp32", format_parity(report))
+        if report["min_cosine"] < MIN_PARITY_COSINE:
+            logger.warning("⚠️  Minimum cosine is below %s, rankings may differ from the index", MIN_PARITY_COSINE)
+    return embeddings
+
+
+def parity_check(reference: Embeddings, candidate: Embeddings, texts: Sequence[str]) -> Dict[str, float]:
+    """Cosine similarity between the two embedders' query vectors for the same texts."""
+    ref = np.array([reference.embed_query(text) for text in texts], dtype=np.float32)
+    cand = np.array([candidate.embed_query(text) for text in texts], dtype=np.float32)
+    cosine = (ref * cand).sum(axis=1) / (
+        np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1)
+    )
+    return {
+        "texts": len(texts),
+        "mean_cosine": float(cosine.mean()),
+        "min_cosine": float(cosine.min()),
+        "max_abs_diff": float(np.abs(ref - cand).max()),
+    }
+
+
+def format_parity(report: Dict) -> str:
+    return (
+        f"mean cosine {report['mean_cosine']:.5f}, min {report['min_cosine']:.5f} "
+        f"over {report['texts']} queries"
+    )
+
+
+def _parity_path(model_name: str, quantize: bool) -> str:
+    return os.path.join(export_dir(model_name), f"{'int8' if quantize else 'fp32'}_{PARITY_FILE}")
+
+
+def load_parity_report(model_name: str, quantize: bool) -> Optional[Dict]:
+    try:
+        with open(_parity_path(model_name, quantize), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _query_latencies_ms(embedder: Embeddings, texts: Sequence[str]) -> List[float]:
+    latencies = []
+    for text in texts:
+        started = time.perf_counter()
+        embedder.embed_query(text)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def main():
+    import llm_rag_setup as rag
+    from benchmark import load_app_examples, load_example_questions, peak_rss_mb
+
+    parser = argparse.ArgumentParser(
+        description="Export the e5 embedder to ONNX and compare it with the PyTorch model"
+    )
+    parser.add_argument("--no-quantize", action="store_true", help="Only check the fp32 export")
+    parser.add_argument("--threads", type=int, default=rag.EMBEDDING_ONNX_THREADS)
+    args = parser.parse_args()
+    rag.configure_logging()
+
+    texts = [q for qs in load_example_questions().values() for q in qs] + load_app_examples()
+    model_name = rag.EMBEDDING_MODEL_NAME
+
+    # Peak RSS only grows, so each backend's cost is the increase it causes;
+    # libraries are imported up front and the lightest model is loaded first
+    import onnxruntime  # noqa: F401
+    import sentence_transformers  # noqa: F401
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    variants = [False] if args.no_quantize else [True, False]
+    rows = []
+    for quantize in variants:
+        rss_before = peak_rss_mb()
+        onnx_embedder = create_onnx_embeddings(model_name, quantize, args.threads)
+        _query_latencies_ms(onnx_embedder, texts[:3])
+        latencies = _query_latencies_ms(onnx_embedder, texts)
+        rows.append(
+            (f"onnx-{'int8' if quantize else 'fp32'}", latencies, peak_rss_mb() - rss_before, onnx_embedder, quantize)
+        )
+
+    rss_before = peak_rss_mb()
+    torch_embedder = HuggingFaceEmbeddings(model_name=model_name)
+    _query_latencies_ms(torch_embedder, texts[:3])
+    torch_latencies = _query_latencies_ms(torch_embedder, texts)
+    torch_rss = peak_rss_mb() - rss_before
+
+    print(f"\n📊 {len(texts)} sorgu, {model_name}\n")
+    print(f"{'backend':<10} {'p50 ms':>8} {'p95 ms':>8} {'+RSS MB':>8}  parity")
+    for name, latencies, rss, embedder, quantize in rows:
+        report = parity_check(torch_embedder, embedder, texts)
+        with open(_parity_path(model_name, quantize), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(
+            f"{name:<10} {np.percentile(latencies, 50):>8.2f} {np.percentile(latencies, 95):>8.2f} "
+            f"{rss:>8.0f}  {format_parity(report)}"
+        )
+    print(
+        f"{'torch':<10} {np.percentile(torch_latencies, 50):>8.2f} "
+        f"{np.percentile(torch_latencies, 95):>8.2f} {torch_rss:>8.0f}  -"
+    )
+    print(f"\n✅ Parity raporları {export_dir(model_name)} altına kaydedildi")
+
+
+if __name__ == "__main__":
+    main()
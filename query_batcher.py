@@ -0,0 +1,112 @@
+import bisect
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+# Upper bounds of the wait-time histogram buckets, in milliseconds
+WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class QueryBatcher(Embeddings):
+    """
+    Coalesces concurrent embed_query calls into one forward pass.
+
+    The first query starts a window of max_wait seconds; every query that
+    arrives before it closes (up to max_batch_size) is embedded together by
+    batch_fn and each caller gets its own vector back through a future.
+    Queries arriving while a batch is running form the next one, so under
+    load batches grow by themselves. The window only opens after a batch of
+    more than one query, so a lone user does not pay max_wait per query.
+
+    batch_fn defaults to the embedder's embed_queries (CachedEmbeddings) or
+    embed_documents, which must give the same vectors as embed_query (true
+    for HuggingFaceEmbeddings without a separate query prompt).
+    Document embedding is passed straight through.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        max_batch_size: int = 16,
+        max_wait: float = 0.005,
+        batch_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+    ):
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batch_fn = batch_fn or getattr(embedder, "embed_queries", embedder.embed_documents)
+
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes: Dict[int, int] = {}
+        self._wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.batches = 0
+        self.queries = 0
+        self._last_batch_size = 0
+
+        self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._worker.start()
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def _collect(self) -> List[Tuple[str, Future, float]]:
+        batch = [self._queue.get()]
+        wait = self.max_wait if self._last_batch_size > 1 else 0.0
+        deadline = time.perf_counter() + wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Whatever is already queued joins even after the window closed
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._last_batch_size = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            self._record(len(batch), [started - submitted for _, _, submitted in batch])
+
+            try:
+                vectors = self.batch_fn([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result([float(x) for x in vector])
+
+    def _record(self, size: int, waits: List[float]):
+        with self._lock:
+            self.batches += 1
+            self.queries += size
+            self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+            for wait in waits:
+                self._wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, wait * 1000)] += 1
+
+    def stats(self) -> Dict:
+        """Batch-size histogram and histogram of time queries waited for their batch."""
+        with self._lock:
+            labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "mean_batch_size": self.queries / self.batches if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "wait_ms": dict(zip(labels, self._wait_counts)),
+            }
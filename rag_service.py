@@ -0,0 +1,91 @@
+import asyncio
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional
+
+import llm_rag_setup as rag
+from metadata_filter import Filters
+from request_limiter import QueueFullError, QueueTimeoutError
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+# Metadata returned for every source; fields a chunk lacks come back as None
+SOURCE_FIELDS = ("source_type", "madde_no", "genelge_no", "full_path", "kisim", "bolum")
+
+
+def _text(value) -> Optional[str]:
+    return str(value) if value not in (None, "") else None
+
+
+def source_title(metadata: Dict) -> str:
+    """Human-readable citation, e.g. "Noterlik Kanunu - Madde 60 (Başlık)" or "Genelge 45 - Madde 3"."""
+    madde_no = metadata.get("madde_no", "N/A")
+    if metadata.get("source_type", "genelge") == "kanun":
+        title = f"Noterlik Kanunu - Madde {madde_no}"
+        if metadata.get("madde_baslik"):
+            title += f" ({metadata['madde_baslik']})"
+        return title
+    return f"Genelge {metadata.get('genelge_no', 'N/A')} - Madde {madde_no}"
+
+
+def source_info(doc: "Document") -> Dict:
+    """JSON-ready description of a source chunk: SOURCE_FIELDS, chunk_id, title and text."""
+    metadata = doc.metadata
+    # Numbers come as int or str depending on the data file
+    info = {field: _text(metadata.get(field)) for field in SOURCE_FIELDS + ("chunk_id",)}
+    info["title"] = source_title(metadata)
+    info["text"] = doc.page_content
+    return info
+
+
+def answer_payload(result: Dict) -> Dict:
+    """A query_rag / "done" event result as a JSON-ready structured answer."""
+    return {
+        "question": result["query"],
+        "answer": result["result"],
+        "sources": [source_info(doc) for doc in result["source_documents"]],
+        "cached": result.get("cached"),
+        "context_tokens": result.get("context_tokens", 0),
+        "timings_ms": {stage: round(seconds * 1000, 2) for stage, seconds in result.get("timings", {}).items()},
+    }
+
+
+def status() -> Dict:
+    return {
+        "status": rag.get_startup_status(),
+        "ready": rag.is_ready(),
+        "startup_timings_s": rag.get_startup_timings(),
+        "queue": rag.get_queue_stats(),
+    }
+
+
+async def wait_until_ready(timeout: Optional[float] = None) -> bool:
+    """Wait for the background warmup without blocking the event loop."""
+    if rag.is_ready():
+        return True
+    return await asyncio.get_running_loop().run_in_executor(None, rag.wait_until_ready, timeout)
+
+
+async def answer(question: str, filters: Optional[Filters] = None) -> Optional[Dict]:
+    """
+    Structured answer (see answer_payload), None when the question could not
+    be answered. Raises QueueFullError / QueueTimeoutError when the LLM queue
+    is saturated.
+    """
+    result = await rag.aquery_rag(question, filters)
+    return answer_payload(result) if result is not None else None
+
+
+async def stream_answer(question: str, filters: Optional[Filters] = None) -> AsyncIterator[Dict]:
+    """
+    {"type": "token", "text": ...} events, then {"type": "done", **answer_payload}
+    or a single {"type": "error", "message": ...}. A saturated LLM queue
+    ends the stream with an error event whose "busy" is True.
+    """
+    try:
+        async for event in rag.astream_rag(question, filters):
+            if event["type"] == "done":
+                yield {"type": "done", **answer_payload(event)}
+            else:
+                yield event
+    except (QueueFullError, QueueTimeoutError) as e:
+        yield {"type": "error", "message": str(e) or type(e).__name__, "busy": True}
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the wait queue is already at max_queue."""
+
+
+class QueueTimeoutError(TimeoutError):
+    """Raised when a request waited longer than queue_timeout for a slot."""
+
+
+class ConcurrencyLimiter:
+    """
+    Async concurrency limit with a bounded wait queue.
+
+    At most max_concurrency callers hold a slot at once, at most max_queue
+    callers wait for one; further callers are rejected with QueueFullError
+    and waiters give up after queue_timeout seconds with QueueTimeoutError.
+
+        async with limiter:
+            await llm.ainvoke(prompt)
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        queue_timeout: Optional[float] = 30.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._admitted = 0
+        self.in_flight = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        # asyncio primitives are bound to one loop; a new loop gets a fresh one
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self) -> float:
+        """Wait for a slot and return the time spent queueing, in seconds."""
+        semaphore = self._get_semaphore()
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            # Everyone admitted but not yet released; anything beyond
+            # max_concurrency of them is waiting in the queue.
+            if self._admitted >= self.max_concurrency + self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(
+                    f"LLM queue is full ({self.max_queue} requests waiting)"
+                )
+            self._admitted += 1
+            self.peak_queued = max(self.peak_queued, self._queue_depth())
+
+        started = loop.time()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._admitted -= 1
+                self.timeouts += 1
+            raise QueueTimeoutError(
+                f"No LLM slot became free within {self.queue_timeout:.1f}s"
+            ) from None
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+
+        with self._lock:
+            self.in_flight += 1
+        return loop.time() - started
+
+    def _queue_depth(self) -> int:
+        return max(0, self._admitted - self.max_concurrency)
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._admitted -= 1
+            self.completed += 1
+        self._semaphore.release()
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": self._queue_depth(),
+                "peak_queue_depth": self.peak_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
@@ -0,0 +1,109 @@
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from onnx_embeddings import export_onnx_model, onnx_file_name, session_options
+
+ScoredDocs = List[Tuple[Document, float]]
+
+
+class Reranker:
+    """
+    Cross-encoder that rescores (question, chunk) pairs on ONNX Runtime.
+
+    Pairs are scored in batches against a per-query time budget: a batch is
+    only started if the previous one suggests it will finish in time, and
+    scoring stops once the deadline has passed. The candidates scored by
+    then are reordered among themselves and the rest keep the fused order;
+    if none were (e.g. the budget went on waiting for another query's
+    rerank) the fused order is kept. Either way top_n chunks remain.
+
+    A running batch can't be interrupted, so the bound is best-effort: a
+    batch slower than predicted can overrun the budget by up to its own
+    duration.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        top_n: int = 4,
+        time_budget: float = 0.3,
+        batch_size: int = 8,
+        max_length: int = 256,
+        quantize: bool = True,
+        threads: int = 0,
+    ):
+        from sentence_transformers import CrossEncoder
+
+        self.top_n = top_n
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+
+        path = export_onnx_model(model_name, quantize, model_class=CrossEncoder)
+        self.model = CrossEncoder(
+            path,
+            backend="onnx",
+            device="cpu",
+            max_length=max_length,
+            model_kwargs={
+                "file_name": onnx_file_name(quantize),
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options(threads),
+            },
+        )
+        # Fast tokenizers are not safe to share across threads mid-call
+        self._lock = threading.Lock()
+
+        self.reranked = 0
+        self.partial = 0
+        self.fallbacks = 0
+
+    def warmup(self):
+        """One full-size batch outside the budget, so the first query is not the slow one."""
+        with self._lock:
+            self.model.predict([("soru", "metin")] * self.batch_size, show_progress_bar=False)
+
+    def rerank(self, query: str, candidates: ScoredDocs, top_n: Optional[int] = None) -> ScoredDocs:
+        """Best top_n of candidates by cross-encoder score, or the first top_n if over budget."""
+        top_n = max(self.top_n if top_n is None else top_n, 0)
+        if len(candidates) <= 1 or top_n <= 0:
+            return candidates[:top_n]
+
+        deadline = time.perf_counter() + self.time_budget
+        scores = self._score(query, [doc.page_content for doc, _ in candidates], deadline)
+        if not len(scores):
+            self.fallbacks += 1
+            return candidates[:top_n]
+
+        if len(scores) < len(candidates):
+            self.partial += 1
+        else:
+            self.reranked += 1
+        order = np.argsort(-scores, kind="stable")
+        reranked = [(candidates[i][0], float(scores[i])) for i in order]
+        return (reranked + candidates[len(scores) :])[:top_n]
+
+    def _score(self, query: str, texts: List[str], deadline: float) -> np.ndarray:
+        """Scores of the leading texts that fit in the budget (possibly none)."""
+        scores: List[float] = []
+        if not self._lock.acquire(timeout=max(0.0, deadline - time.perf_counter())):
+            return np.array(scores, dtype=np.float32)
+        try:
+            batch_time = 0.0
+            for start in range(0, len(texts), self.batch_size):
+                now = time.perf_counter()
+                if now + batch_time > deadline:
+                    break
+                batch = [(query, text) for text in texts[start : start + self.batch_size]]
+                predicted = self.model.predict(batch, batch_size=len(batch), show_progress_bar=False)
+                scores.extend(np.asarray(predicted).ravel().tolist())
+                batch_time = time.perf_counter() - now
+            return np.array(scores, dtype=np.float32)
+        finally:
+            self._lock.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {"reranked": self.reranked, "partial": self.partial, "fallbacks": self.fallbacks}
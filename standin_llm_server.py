@@ -0,0 +1,308 @@
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+MODEL_ID = "stand-in/Qwen2.5-7B-Instruct"
+
+_KANUN_MADDE_RE = re.compile(r"NOTERLİK KANUNU \(1512\)\n(?:.*\n)*?Madde (\S+)")
+_GENELGE_MADDE_RE = re.compile(r"GENELGE NO (\d+):.*\nMadde (\S+)")
+_FILLER = "Bu hüküm noterlik işlemlerinin yürütülmesinde esas alınır ve ilgili genelgelerle birlikte uygulanır."
+
+
+@dataclass
+class StandInConfig:
+    """
+    Latency model of the stand-in: ttft seconds (plus prefill_per_1k_chars for
+    every 1000 prompt characters) before the first token, then token_latency
+    seconds per token, response_tokens tokens per answer (capped by max_tokens).
+
+    Faults for exercising client retries and hedging: error_rate of the
+    requests get a 503, straggler_rate of them take straggler_delay seconds
+    longer. Both are drawn from a generator seeded with seed.
+    """
+
+    ttft: float = 0.2
+    token_latency: float = 0.02
+    prefill_per_1k_chars: float = 0.0
+    response_tokens: int = 120
+    error_rate: float = 0.0
+    straggler_rate: float = 0.0
+    straggler_delay: float = 1.0
+    seed: int = 0
+
+
+def standin_answer(prompt: str, tokens: int) -> List[str]:
+    """
+    Deterministic answer of the given number of tokens (words) that cites the
+    first Kanun / genelge article of the context, as the real model is asked to.
+    """
+    citations = []
+    kanun = _KANUN_MADDE_RE.search(prompt)
+    if kanun:
+        citations.append(f"Noterlik Kanunu Madde {kanun.group(1)} uyarınca")
+    genelge = _GENELGE_MADDE_RE.search(prompt)
+    if genelge:
+        citations.append(f"Genelge {genelge.group(1)}, Madde {genelge.group(2)} kapsamında")
+    words = " ".join(citations or ["Genel olarak"]).split()
+
+    filler = _FILLER.split()
+    while len(words) < tokens:
+        words.extend(filler)
+    return [word + " " for word in words[:tokens]]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "StandInServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self, events: Iterator[str]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # Chunked, so the connection stays open for the client's next request
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in events:
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_GET(self):
+        if self.path in ("/health", "/"):
+            self._send_json({"status": "ok"})
+        elif self.path == "/info":
+            self._send_json({"model_id": MODEL_ID, **self.server.config.__dict__})
+        else:
+            self._send_json({"error": "Not found"}, 404)
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except json.JSONDecodeError as e:
+            self._send_json({"error": f"Invalid JSON: {e}"}, 400)
+            return
+
+        fault = self.server.draw_fault()
+        if fault == "error":
+            self._send_json({"error": "Model is overloaded", "error_type": "overloaded"}, 503)
+            return
+        if fault == "straggler":
+            time.sleep(self.server.config.straggler_delay)
+
+        if self.path.rstrip("/") == "/v1/chat/completions":
+            self._chat_completion(request)
+        elif self.path.rstrip("/") in ("", "/generate", "/generate_stream"):
+            self._text_generation(request, stream=self.path == "/generate_stream")
+        else:
+            self._send_json({"error": "Not found"}, 404)
+
+    def _chat_completion(self, request: Dict):
+        # Same text the model would see: the concatenated message contents
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        tokens = self.server.generate(prompt, request.get("max_tokens"))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": len(prompt) // 3,
+            "completion_tokens": len(tokens),
+            "total_tokens": len(prompt) // 3 + len(tokens),
+        }
+
+        if not request.get("stream"):
+            text = "".join(self.server.paced(tokens))
+            self._send_json(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": MODEL_ID,
+                    "system_fingerprint": "stand-in",
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "logprobs": None,
+                            "finish_reason": "length",
+                        }
+                    ],
+                    "usage": usage,
+                }
+            )
+            return
+
+        def events() -> Iterator[str]:
+            for i, token in enumerate(self.server.paced(tokens)):
+                last = i == len(tokens) - 1
+                yield json.dumps(
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": created,
+                        "model": MODEL_ID,
+                        "system_fingerprint": "stand-in",
+                        "choices": [
+                            {
+                                "index": 0,
+                                "delta": {"role": "assistant", "content": token},
+                                "logprobs": None,
+                                "finish_reason": "length" if last else None,
+                            }
+                        ],
+                        "usage": usage if last else None,
+                    },
+                    ensure_ascii=False,
+                )
+            yield "[DONE]"
+
+        self._send_events(events())
+
+    def _text_generation(self, request: Dict, stream: bool):
+        parameters = request.get("parameters") or {}
+        tokens = self.server.generate(str(request.get("inputs", "")), parameters.get("max_new_tokens"))
+        if not (stream or request.get("stream")):
+            # The serverless Inference API answers with a list, a TGI server with an object
+            text = "".join(self.server.paced(tokens))
+            self._send_json([{"generated_text": text}])
+            return
+
+        def events() -> Iterator[str]:
+            generated = []
+            for i, token in enumerate(self.server.paced(tokens)):
+                generated.append(token)
+                last = i == len(tokens) - 1
+                yield json.dumps(
+                    {
+                        "index": i + 1,
+                        "token": {"id": i, "text": token, "logprob": 0.0, "special": False},
+                        "generated_text": "".join(generated) if last else None,
+                        "details": None,
+                    },
+                    ensure_ascii=False,
+                )
+
+        self._send_events(events())
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Deterministic local stand-in for the generation endpoint.
+
+    Speaks the parts of the Hugging Face Inference / TGI HTTP API the
+    clients use: the OpenAI-compatible POST /v1/chat/completions and the
+    text-generation routes POST / , /generate and /generate_stream, streamed
+    as server-sent events when asked. Answers depend only on the prompt and
+    latencies and faults only on StandInConfig, so runs are repeatable offline.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: Optional[StandInConfig] = None):
+        super().__init__(address, _Handler)
+        self.config = config or StandInConfig()
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        self.requests = 0
+        self.errors = 0
+        self.stragglers = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # Clients drop the losing copy of a hedged request; nothing to report
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+    def draw_fault(self) -> Optional[str]:
+        """Fault for the next request: "error", "straggler" or None."""
+        with self._lock:
+            draw = self._random.random()
+            if draw < self.config.error_rate:
+                self.errors += 1
+                return "error"
+            if draw < self.config.error_rate + self.config.straggler_rate:
+                self.stragglers += 1
+                return "straggler"
+        return None
+
+    def generate(self, prompt: str, max_tokens: Optional[int]) -> List[str]:
+        with self._lock:
+            self.requests += 1
+        count = self.config.response_tokens if max_tokens is None else min(self.config.response_tokens, int(max_tokens))
+        # Prefill happens before the first token whatever the answer length
+        time.sleep(self.config.ttft + self.config.prefill_per_1k_chars * len(prompt) / 1000)
+        return standin_answer(prompt, max(count, 1))
+
+    def paced(self, tokens: List[str]) -> Iterator[str]:
+        for i, token in enumerate(tokens):
+            if i and self.config.token_latency:
+                time.sleep(self.config.token_latency)
+            yield token
+
+
+def start_standin_server(
+    host: str = "127.0.0.1", port: int = 0, config: Optional[StandInConfig] = None
+) -> StandInServer:
+    """Serve on a daemon thread (port 0 picks a free port, see .url)."""
+    server = StandInServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="standin-llm", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic stand-in LLM server (TGI / HF Inference API)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds per further token")
+    parser.add_argument("--prefill-per-1k-chars", type=float, default=0.0, help="Extra TTFT per 1000 prompt chars")
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Fraction of requests delayed further")
+    parser.add_argument("--straggler-delay", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = StandInConfig(
+        ttft=args.ttft,
+        token_latency=args.token_latency,
+        prefill_per_1k_chars=args.prefill_per_1k_chars,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        straggler_rate=args.straggler_rate,
+        straggler_delay=args.straggler_delay,
+        seed=args.seed,
+    )
+    server = StandInServer((args.host, args.port), config)
+    print(f"✅ Stand-in LLM listening on {server.url} ({config})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class PhaseTimer:
+    """
+    Wall-clock time spent in each named startup phase, in the order the
+    phases first ran. Repeated phases accumulate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._phases[name] = self._phases.get(name, 0.0) + elapsed
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._phases)
+
+    def report(self, title: str = "Startup") -> str:
+        phases = self.as_dict()
+        width = max((len(name) for name in phases), default=0)
+        lines = [f"⏱️  {title} ({sum(phases.values()):.2f} s in phases, "
+                 f"{time.perf_counter() - self.started:.2f} s since start)"]
+        for name, seconds in phases.items():
+            lines.append(f"   {name:<{width}}  {seconds * 1000:>9.1f} ms")
+        return "\n".join(lines)
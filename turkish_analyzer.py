@@ -0,0 +1,152 @@
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional
+
+ANALYZER_VERSION = 2
+
+TURKISH_STOPWORDS = frozenset(
+    """
+    acaba ait ama ancak bazı bile bir biri birkaç bu buna bunu bunun da daha
+    dair de değil diye en fakat gibi göre hangi hangisi hem hep her hiç için
+    ile ise kadar ki kim mi mı mu mü nasıl ne neden nedir neler nelerdir niçin
+    o olan olarak olduğu olup ona onu onun sonra şu tarafından üzere ve veya
+    ya yani yine önce çok ayrıca kendi olması olur
+    """.split()
+)
+
+# Inflectional suffixes, longest first; derivational ones (-lik, -ci, ...) are
+# left alone so that e.g. "noter" and "noterlik" stay distinct terms. The
+# possessive + case compounds ("maddesinde", "kanununda") come off in one step.
+_SUFFIXES = sorted(
+    """
+    lerinden larından lerinin larının lerine larına lerini larını lerinde larında
+    lerin ların leri ları ler lar
+    sinden sından sunden sundan sünden sinde sında sunda sünde sinin sının sunun
+    sünün sine sına suna süne sini sını sunu sünü inden ından unden undan ünden
+    inde ında unda ünde inin ının unun ünün ine ına una üne
+    ndaki ndeki daki deki taki teki ndan nden dan den tan ten
+    nın nin nun nün ımız imiz umuz ümüz sı si su sü yı yi yu yü ya ye na ne da
+    de ta te ın in un ün ı i u ü a e
+    """.split(),
+    key=len,
+    reverse=True,
+)
+_VOWELS = frozenset("aeıioöuü")
+_FINAL_VOWELS = frozenset("aeıiuü")
+
+# Inflections of the corpus's core terms; each family must share one stem
+STEM_FAMILIES = {
+    "kanun": "kanun kanunu kanuna kanunda kanundan kanunun kanununda kanunlar kanunların kanunlarında",
+    "madde": "madde maddesi maddeye maddede maddenin maddesinde maddesine maddesini maddeleri maddelerin",
+    "genelge": "genelge genelgesi genelgeye genelgede genelgenin genelgesinde genelgeler genelgelerde",
+    "noterlik": "noterlik noterliği noterliğe noterlikte noterliğin noterliğinde noterlikler noterliklerin",
+}
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+_HEADER_SEPARATOR = "\n---\n"
+
+
+def turkish_lower(text: str) -> str:
+    # str.lower() maps "I" to "i" and "İ" to "i̇", both wrong for Turkish
+    return text.replace("I", "ı").replace("İ", "i").lower()
+
+
+def strip_header(content: str) -> str:
+    """Drop the "GENELGE NO … / Madde …" lines added by _create_hierarchical_content."""
+    head, separator, body = content.partition(_HEADER_SEPARATOR)
+    return body if separator else content
+
+
+class TurkishAnalyzer:
+    """
+    Tokenizer for the keyword index: Turkish case folding, punctuation
+    stripping, stop words and a light suffix stemmer.
+    The same instance must be used at index and query time.
+    """
+
+    def __init__(
+        self,
+        stem: bool = True,
+        exclude_header: bool = False,
+        min_stem_length: int = 4,
+        stopwords: Optional[FrozenSet[str]] = None,
+        cache_size: int = 100_000,
+    ):
+        self.stem = stem
+        self.exclude_header = exclude_header
+        self.min_stem_length = min_stem_length
+        self.stopwords = TURKISH_STOPWORDS if stopwords is None else stopwords
+        self._stem_token = lru_cache(maxsize=cache_size)(self._stem_uncached)
+
+    def config(self) -> Dict:
+        return {
+            "analyzer": "turkish",
+            "version": ANALYZER_VERSION,
+            "stem": self.stem,
+            "exclude_header": self.exclude_header,
+            "min_stem_length": self.min_stem_length,
+            "stopwords": sorted(self.stopwords),
+        }
+
+    def _stem_uncached(self, token: str) -> str:
+        if not self.stem or token.isdigit():
+            return token
+
+        for _ in range(2):
+            for suffix in _SUFFIXES:
+                rest = len(token) - len(suffix)
+                if not token.endswith(suffix) or rest < self.min_stem_length:
+                    continue
+                # An n-initial case suffix follows a vowel ("madde-nin"); after a
+                # consonant the "n" belongs to the stem ("kanun-da")
+                if suffix[0] == "n" and token[rest - 1] not in _VOWELS:
+                    continue
+                token = token[:rest]
+                break
+            else:
+                break
+
+        # "kanun-un" and "madde-nin" can't be told apart without a lexicon, so a
+        # final "n" after a vowel and then a final vowel are dropped: every
+        # reading of "kanun", "kanunun", "kanuna" ends up as "kanu"
+        if token[-1] == "n" and token[-2:-1] in _VOWELS and len(token) > self.min_stem_length:
+            token = token[:-1]
+        if token[-1] in _FINAL_VOWELS and len(token) > self.min_stem_length:
+            token = token[:-1]
+
+        # Ünsüz yumuşaması: "noterliğin" -> "noterliğ" -> "noterlik"
+        if token.endswith("ğ"):
+            token = token[:-1] + "k"
+        return token
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = []
+        for token in _TOKEN_RE.findall(turkish_lower(text)):
+            if token in self.stopwords or (len(token) == 1 and not token.isdigit()):
+                continue
+            tokens.append(self._stem_token(token))
+        return tokens
+
+    def analyze_document(self, content: str) -> List[str]:
+        if self.exclude_header:
+            content = strip_header(content)
+        return self(content)
+
+    def stem_family_mismatches(self) -> Dict[str, List[str]]:
+        """STEM_FAMILIES whose inflections get more than one stem, with those stems."""
+        mismatches = {}
+        for family, words in STEM_FAMILIES.items():
+            stems = sorted({self._stem_token(word) for word in words.split()})
+            if len(stems) > 1:
+                mismatches[family] = stems
+        return mismatches
+
+
+if __name__ == "__main__":
+    analyzer = TurkishAnalyzer()
+    for family, words in STEM_FAMILIES.items():
+        print(f"{family}: " + ", ".join(f"{word}={analyzer._stem_token(word)}" for word in words.split()))
+    mismatches = analyzer.stem_family_mismatches()
+    if mismatches:
+        raise SystemExit(f"❌ Split stem families: {mismatches}")
+    print("✅ Every stem family collapses to one stem")